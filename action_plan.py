@@ -0,0 +1,102 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from browser_controller import BrowserController
+
+logger = logging.getLogger(__name__)
+
+# Инструменты, которые можно включать в план (без вложенных планов)
+PLAN_STEP_TOOLS = [
+    "navigate", "click", "type", "scroll", "wait",
+    "extract_text", "get_elements", "screenshot", "get_url", "wait_for_element"
+]
+
+PLAN_TOOL_DEFINITION: Dict[str, Any] = {
+    "name": "execute_plan",
+    "description": (
+        "Execute an ordered batch of browser actions back-to-back without consulting you between them. "
+        "Each step may declare cheap expectations checked right after it runs; the batch stops at the first "
+        "failed step or expectation and reports what happened. Use it for predictable sequences such as "
+        "typing a query, submitting it and opening the first result."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "steps": {
+                "type": "array",
+                "minItems": 1,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "tool": {"type": "string", "enum": PLAN_STEP_TOOLS},
+                        "input": {"type": "object", "description": "Arguments of the tool"},
+                        "expect": {
+                            "type": "object",
+                            "description": "Postconditions checked after the step",
+                            "properties": {
+                                "element_exists": {"type": "string", "description": "CSS selector that must be present"},
+                                "url_contains": {"type": "string", "description": "Substring of the resulting URL"},
+                                "text_present": {"type": "string", "description": "Text that must appear on the page"}
+                            }
+                        }
+                    },
+                    "required": ["tool", "input"]
+                }
+            }
+        },
+        "required": ["steps"]
+    }
+}
+
+
+async def check_postconditions(browser: BrowserController, expect: Dict[str, Any],
+                               timeout: int = 2000) -> Optional[str]:
+    """Проверить постусловия шага плана; вернуть описание нарушения или None"""
+    if expect.get("url_contains"):
+        url = await browser.get_current_url()
+        if expect["url_contains"] not in url:
+            return f"URL does not contain '{expect['url_contains']}' (current: {url})"
+
+    if expect.get("element_exists"):
+        if not await browser.element_exists(expect["element_exists"], timeout):
+            return f"element '{expect['element_exists']}' not found"
+
+    if expect.get("text_present"):
+        if not await browser.contains_text(expect["text_present"]):
+            return f"text '{expect['text_present']}' not present on the page"
+
+    return None
+
+
+async def run_plan(browser: BrowserController, steps: List[Dict[str, Any]],
+                   run_step: Callable[[str, Dict[str, Any]], Awaitable[Optional[str]]]) -> str:
+    """Выполнить шаги плана подряд, остановившись на первой ошибке или нарушенном постусловии
+
+    run_step выполняет один инструмент и возвращает его результат либо
+    None, если шаг был отклонен.
+    """
+    report = []
+    completed = 0
+    for number, step in enumerate(steps, 1):
+        tool_name = step.get("tool")
+        label = f"Step {number} {tool_name}"
+        if tool_name not in PLAN_STEP_TOOLS:
+            report.append(f"{label}: unsupported tool, plan stopped")
+            break
+
+        result = await run_step(tool_name, step.get("input") or {})
+        if result is None:
+            report.append(f"{label}: rejected by user, plan stopped")
+            break
+        report.append(f"{label}: {result[:300]}")
+        if result.startswith("Error executing"):
+            report.append("Plan stopped after failed step")
+            break
+
+        violation = await check_postconditions(browser, step.get("expect") or {})
+        if violation:
+            logger.info(f"План остановлен на шаге {number}: {violation}")
+            report.append(f"{label} expectation failed: {violation}. Plan stopped")
+            break
+        completed += 1
+
+    return f"Plan completed {completed}/{len(steps)} steps\n" + "\n".join(report)
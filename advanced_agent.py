@@ -1,37 +1,65 @@
 import asyncio
 import json
 import logging
-from typing import Optional, Dict, Any, List
-from anthropic import Anthropic
+import time
+from typing import Optional, Callable, Dict, Any, List, Set, Tuple
 from browser_controller import BrowserController
-from context_manager import ContextManager
+from config import Config
+from context_manager import PAGE_PREVIEW_TOKENS, ContextManager
+from action_plan import PLAN_TOOL_DEFINITION, run_plan
 from error_handler import ErrorHandler
+from llm_backend import CachingBackend, LLMBackend, create_backend, response_deadline
+from metrics import MetricsExporter, TaskMetrics
+from tools import TOOL_DEFINITIONS, extract_tool_calls, response_to_message, response_text, tool_result_block
+from trajectory_store import TrajectoryRecorder, TrajectoryStore, replay_trajectory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# После этих инструментов страница, скорее всего, изменилась - ее снимок начинается заранее
+_PREFETCH_AFTER_TOOLS = {"navigate", "click", "type", "scroll", "wait", "wait_for_element", "execute_plan"}
+
 
 class AdvancedAIAgent:
     """Продвинутый AI агент с улучшенной обработкой ошибок и контекста"""
     
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
-        self.browser = BrowserController()
-        self.context_manager = ContextManager()
+    def __init__(self, api_key: str, browser: Optional[BrowserController] = None,
+                 interactive: bool = True, metrics_exporter: Optional[MetricsExporter] = None,
+                 llm: Optional[LLMBackend] = None):
+        self.llm = llm or create_backend(api_key)
+        self.browser = browser or BrowserController()
+        self.context_manager = ContextManager(
+            max_tokens=Config.CONTEXT_CONFIG["max_tokens"],
+            token_buffer=Config.CONTEXT_CONFIG["token_buffer"]
+        )
         self.error_handler = ErrorHandler()
+        self.trajectory_store = (
+            TrajectoryStore(Config.TRAJECTORY_CONFIG["directory"])
+            if Config.TRAJECTORY_CONFIG["enabled"] else None
+        )
+        self.recorder: Optional[TrajectoryRecorder] = None
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self.metrics = TaskMetrics("")
+        self.metrics_exporter = metrics_exporter or MetricsExporter.from_config()
+        self.interactive = interactive
         self.conversation_history = []
+        self.observations = []
         self.max_iterations = 20
         self.destructive_actions = {"submit", "delete", "remove", "pay", "checkout", "purchase", "confirm"}
         self.task_state = {
             "started_at": None,
             "iterations": 0,
             "last_url": None,
-            "actions_taken": []
+            "actions_taken": [],
+            "usage": {},
+            "replayed_steps": 0,
+            "completed": False
         }
 
     async def initialize(self):
         """Инициализировать продвинутого агента"""
-        await self.browser.launch()
+        if self.browser.page is None:
+            await self.browser.launch()
         logger.info("Продвинутый агент инициализирован")
 
     async def close(self):
@@ -39,44 +67,108 @@ class AdvancedAIAgent:
         await self.browser.close()
 
     async def _get_page_state(self) -> Dict[str, Any]:
-        url = await self.browser.get_current_url()
-        text_content = await self.browser.extract_text_content()
-        interactive_elements = await self.browser.get_interactive_elements()
+        if self._prefetch_task is not None:
+            # Упреждающий снимок уже в кэше браузера или почти готов; дельта возьмет его оттуда
+            await asyncio.gather(self._prefetch_task, return_exceptions=True)
+            self._prefetch_task = None
+        delta = await self.browser.snapshot_delta()
         
         return {
-            "url": url,
-            "page_content": text_content,
-            "interactive_elements": interactive_elements
+            "url": delta["url"],
+            "title": delta["title"],
+            "page_content": delta["text"],
+            "interactive_elements": delta["elements"],
+            "delta": delta
         }
 
-    async def _parse_tool_calls(self, response_text: str) -> List[Dict[str, Any]]:
-        tool_calls = []
+    def _page_message(self, task: str, page_state: Dict[str, Any], pending_results: List[Dict[str, Any]],
+                      replay_section: str) -> Dict[str, Any]:
+        """Сообщение пользователя с состоянием страницы и результатами предыдущих инструментов"""
+        summary = self.context_manager.create_page_summary(
+            page_state["url"],
+            page_state["page_content"],
+            page_state["interactive_elements"],
+            title=page_state["title"],
+            delta=page_state["delta"]
+        )
         
-        if "<tool_use" in response_text:
-            import re
-            pattern = r'<tool_use id="([^"]+)" name="([^"]+)">(.*?)</tool_use>'
-            matches = re.findall(pattern, response_text, re.DOTALL)
-            
-            for tool_id, tool_name, tool_input in matches:
-                try:
-                    input_data = json.loads(tool_input.strip())
-                    tool_calls.append({
-                        "id": tool_id,
-                        "name": tool_name,
-                        "input": input_data
-                    })
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to parse tool input: {tool_input}")
+        user_message = f"""{summary}
+
+Task: {task}
+{replay_section}
+Actions taken so far: {', '.join(self.task_state['actions_taken'][-5:]) if self.task_state['actions_taken'] else 'None'}
+
+What should I do next?"""
+        
+        return {
+            "role": "user",
+            "content": pending_results + [{"type": "text", "text": user_message}] if pending_results else user_message
+        }
+
+    def _enforce_budget(self, system_prompt: str) -> Dict[str, int]:
+        """Уложить историю в бюджет токенов и вернуть разбивку запроса"""
+        history = self.conversation_history
+        self.conversation_history, breakdown = self.context_manager.enforce_budget(
+            system_prompt, history, self._tool_definitions()
+        )
+        dropped = breakdown["dropped_messages"]
+        if dropped:
+            # Первое оставшееся сообщение заменено копией с результатами инструментов в виде текста
+            for observation in self.observations:
+                if observation["message"] is history[dropped]:
+                    observation["message"] = self.conversation_history[0]
+        return breakdown
+
+    async def _start_prefetch(self):
+        """Начать снимок следующего состояния страницы, пока агент ждет модель или разбирает ответ"""
+        await self._cancel_prefetch()
+        self._prefetch_task = asyncio.create_task(self._prefetch_page_state())
+
+    async def _cancel_prefetch(self):
+        # Отмененный снимок дожидается завершения, чтобы не выполнять скрипт на странице параллельно с действием
+        task = self._prefetch_task
+        self._prefetch_task = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _prefetch_page_state(self):
+        try:
+            snapshot = await self.browser.prefetch()
+            if snapshot is not None:
+                self.context_manager.compress_page_content(snapshot["text"], PAGE_PREVIEW_TOKENS)
+        except Exception as e:
+            # Страница могла уйти в навигацию; снимок будет сделан обычным путем
+            logger.debug(f"Prefetch skipped: {e}")
+
+    async def _execute_tool(self, tool_name: str, tool_input: Dict[str, Any], prefetch: bool = True) -> str:
+        # Снимок, начатый до этого действия, устареет и только займет страницу
+        await self._cancel_prefetch()
+        
+        # Handle элемента не переживает перезагрузку страницы, в траекторию пишется селектор
+        recorded_input = tool_input
+        sensitive = False
+        if "selector" in tool_input:
+            recorded_input = dict(tool_input, selector=self.browser.stable_selector(tool_input["selector"]))
+            elem = self.browser.tracked_element(tool_input["selector"]) or {}
+            sensitive = "password" in f"{recorded_input['selector']} {elem.get('type', '')}".lower()
         
-        return tool_calls
+        started = time.monotonic()
+        result = await self._perform_tool(tool_name, tool_input)
+        ok = not result.startswith("Error executing")
+        self.metrics.record_tool(tool_name, time.monotonic() - started, ok)
+        if self.recorder is not None and ok:
+            self.recorder.record(tool_name, recorded_input, await self.browser.get_current_url(), sensitive)
+        if prefetch and Config.AGENT_CONFIG["prefetch"] and tool_name in _PREFETCH_AFTER_TOOLS:
+            await self._start_prefetch()
+        return result
 
-    async def _execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
+    async def _perform_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
         try:
             if tool_name == "navigate":
                 url = tool_input["url"]
                 await self.browser.navigate(url)
                 self.task_state["last_url"] = url
-                await asyncio.sleep(1.5)
                 return f"Successfully navigated to {url}"
             
             elif tool_name == "click":
@@ -87,7 +179,7 @@ class AdvancedAIAgent:
                     return f"Successfully clicked: {selector}"
                 except Exception as e:
                     if await self.error_handler.handle_click_error(selector, self.browser):
-                        await asyncio.sleep(1)
+                        await self.browser.settle()
                         await self.browser.click(selector)
                         return f"Clicked after retry: {selector}"
                     raise
@@ -111,10 +203,15 @@ class AdvancedAIAgent:
                 return f"Waited {seconds} seconds"
             
             elif tool_name == "extract_text":
+                # Чтение не сдвигает базовый снимок: изменения от предыдущих действий попадут в следующую дельту
                 text = await self.browser.extract_text_content()
                 compressed = self.context_manager.compress_page_content(text, 2000)
                 return compressed
             
+            elif tool_name == "read_more":
+                portion = await self.browser.read_text(tool_input.get("cursor"))
+                return self.context_manager.format_text_portion(portion)
+            
             elif tool_name == "get_elements":
                 elements = await self.browser.get_interactive_elements()
                 formatted = self.context_manager.format_elements_for_context(elements, 15)
@@ -140,6 +237,9 @@ class AdvancedAIAgent:
                         return f"Timeout for element: {selector}, continuing..."
                     raise
             
+            elif tool_name == "execute_plan":
+                return await run_plan(self.browser, tool_input["steps"], self._run_plan_step)
+            
             else:
                 return f"Unknown tool: {tool_name}"
         
@@ -149,32 +249,194 @@ class AdvancedAIAgent:
             logger.error(error_msg)
             return error_msg
 
+    async def _call_model(self, system_prompt: str, on_tool_use: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Запросить ответ модели, не блокируя цикл событий
+
+        В потоковом режиме on_tool_use вызывается для каждого вызова
+        инструмента, как только его аргументы получены полностью.
+        """
+        system, messages = self.context_manager.build_cached_request(system_prompt, self.conversation_history)
+        request = {
+            "model": Config.LLM_CONFIG["model"],
+            "max_tokens": Config.LLM_CONFIG["max_tokens"],
+            "system": system,
+            "tools": self._tool_definitions(),
+            "messages": messages
+        }
+        if Config.LLM_CONFIG["streaming"]:
+            call = self.llm.stream(request, on_tool_use)
+        else:
+            call = self.llm.complete(request)
+        
+        response = await asyncio.wait_for(call, timeout=response_deadline())
+        self._record_usage(response.usage)
+        return response
+
+    async def _handle_tool_call(self, tool_call: Dict[str, Any], observation: Dict[str, Any]) -> Dict[str, Any]:
+        """Выполнить вызов инструмента с проверкой деструктивности и вернуть блок tool_result"""
+        tool_name = tool_call["name"]
+        tool_input = tool_call["input"]
+        
+        if not await self._confirm_action(tool_name, tool_input):
+            observation["actions"].append(f"{tool_name} (rejected)")
+            return tool_result_block(
+                tool_call["id"], "User rejected this action. Try a different approach.", is_error=True
+            )
+        
+        result = await self._execute_tool(tool_name, tool_input)
+        logger.info(f"Result: {result[:200]}")
+        
+        observation["actions"].append(f"{tool_name}({json.dumps(tool_input, ensure_ascii=False)[:80]})")
+        observation["outcomes"].append(result)
+        return tool_result_block(tool_call["id"], result, is_error=result.startswith(f"Error executing {tool_name}"))
+
+    async def _confirm_action(self, tool_name: str, tool_input: Dict[str, Any]) -> bool:
+        """Запросить подтверждение деструктивного действия; безопасные действия разрешены сразу"""
+        is_destructive = await self._check_destructive_action(tool_name, tool_input)
+        if not is_destructive:
+            return True
+        
+        logger.warning(f"Destructive action: {tool_name}({tool_input})")
+        if not self.interactive:
+            return False
+        user_input = await asyncio.get_running_loop().run_in_executor(
+            None, input, f"\n⚠️  Agent wants to: {tool_name}({json.dumps(tool_input)})\nAllow? (y/n): "
+        )
+        return user_input.lower() == 'y'
+
+    async def _run_plan_step(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[str]:
+        if not await self._confirm_action(tool_name, tool_input):
+            return None
+        # Следующий шаг плана сразу отменил бы снимок; план снимается один раз после выполнения
+        return await self._execute_tool(tool_name, tool_input, prefetch=False)
+
+    def _tool_definitions(self) -> List[Dict[str, Any]]:
+        if Config.AGENT_CONFIG["plan_mode"]:
+            return TOOL_DEFINITIONS + [PLAN_TOOL_DEFINITION]
+        return TOOL_DEFINITIONS
+
+    async def _replay_recorded(self, task: str) -> Optional[str]:
+        """Повторить сохраненную траекторию задачи; вернуть заметку для модели"""
+        trajectory = self.trajectory_store.load(task)
+        if not trajectory or not trajectory["steps"]:
+            return None
+        
+        logger.info(f"Replaying recorded trajectory ({len(trajectory['steps'])} steps)")
+        replay = await replay_trajectory(self.browser, trajectory, self._run_plan_step)
+        self.task_state["replayed_steps"] = replay["replayed"]
+        note = (f"Replayed {replay['replayed']}/{replay['total']} steps recorded "
+                f"from a previous successful run of this task.")
+        if replay["diverged"]:
+            note += f" Replay stopped: {replay['diverged']}. Continue the task from the current page."
+        else:
+            note += " Check the current page and finish the task."
+        return note
+
+    async def _run_tool_after(self, previous: Optional[asyncio.Task], tool_call: Dict[str, Any],
+                              observation: Dict[str, Any], started: Set[str]) -> Dict[str, Any]:
+        if previous is not None:
+            await previous
+        started.add(tool_call["id"])
+        return await self._handle_tool_call(tool_call, observation)
+
+    async def _cancel_tools(self, dispatched: List[asyncio.Task]):
+        for pending in dispatched:
+            pending.cancel()
+        await asyncio.gather(*dispatched, return_exceptions=True)
+
+    async def _finish_started_tools(self, dispatched: List[asyncio.Task], tool_calls: List[Dict[str, Any]],
+                                    started: Set[str]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Дождаться уже начатых инструментов и отменить остальные
+
+        Начатое действие могло изменить страницу, поэтому его результат
+        нужно сохранить в истории, а не отбросить вместе с ответом модели.
+        """
+        for task, tool_call in zip(dispatched, tool_calls):
+            if tool_call["id"] not in started:
+                task.cancel()
+        results = await asyncio.gather(*dispatched, return_exceptions=True)
+        finished = []
+        for tool_call, result in zip(tool_calls, results):
+            if tool_call["id"] not in started:
+                continue
+            if not isinstance(result, dict):
+                result = tool_result_block(tool_call["id"], f"Error executing {tool_call['name']}: {result}", is_error=True)
+            finished.append((tool_call, result))
+        return finished
+
+    def _record_usage(self, usage):
+        call_usage = {
+            "input": usage.input_tokens,
+            "output": usage.output_tokens,
+            "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write": getattr(usage, "cache_creation_input_tokens", None) or 0
+        }
+        for key, value in call_usage.items():
+            self.task_state["usage"][key] += value
+        self.metrics.record_llm_call(call_usage)
+        logger.info(f"LLM usage: {call_usage}, task total: {self.task_state['usage']}")
+
     async def _check_destructive_action(self, tool_name: str, tool_input: Dict[str, Any]) -> bool:
         if tool_name == "click":
-            selector = tool_input.get("selector", "").lower()
+            selector = tool_input.get("selector", "")
+            # Для handle вида @12 проверяются селектор и текст самого элемента
+            elem = self.browser.tracked_element(selector) or {}
+            description = f"{selector} {elem.get('selector', '')} {elem.get('text', '')}".lower()
             for action in self.destructive_actions:
-                if action in selector:
+                if action in description:
                     return True
         return False
 
-    async def execute_task(self, task: str) -> str:
+    async def execute_task(self, task: str, task_id: Optional[str] = None) -> str:
+        """Выполнить задачу; отчет о времени и токенах остается в self.metrics"""
+        self.metrics = TaskMetrics(task, task_id)
+        settle_before = dict(self.browser.settle_stats)
+        status = "failed"
+        try:
+            result = await self._run_task(task)
+            status = "completed" if self.task_state["completed"] else "incomplete"
+            return result
+        finally:
+            self.metrics.iterations = self.task_state["iterations"]
+            self.metrics.record_settle(
+                self.browser.settle_stats["count"] - settle_before["count"],
+                self.browser.settle_stats["total_seconds"] - settle_before["total_seconds"]
+            )
+            await self._cancel_prefetch()
+            self.metrics.finish(status)
+            self.metrics_exporter.export(self.metrics.to_dict())
+            if isinstance(self.llm, CachingBackend):
+                logger.info(f"LLM response cache: {self.llm.cache.summary()}")
+
+    async def _run_task(self, task: str) -> str:
         logger.info(f"Starting advanced task: {task}")
         self.conversation_history = []
+        self.observations = []
         self.task_state["iterations"] = 0
+        self.task_state["usage"] = {"input": 0, "output": 0, "cache_read": 0, "cache_write": 0}
+        self.task_state["replayed_steps"] = 0
+        self.task_state["completed"] = False
+        self.browser.reset_tracking()
+        pending_results = []
+        assistant_message = ""
+        
+        replay_note = None
+        baseline_observation: Optional[Dict[str, Any]] = None
+        self.recorder = None
+        if self.trajectory_store is not None:
+            # Записываются и воспроизведенные шаги: после расхождения траектория сохранится целиком
+            self.recorder = TrajectoryRecorder(task, Config.TRAJECTORY_CONFIG["record_typed_text"])
+            with self.metrics.phase("replay"):
+                replay_note = await self._replay_recorded(task)
         
         system_prompt = """You are an advanced AI agent that controls a web browser to complete complex tasks.
-
-Available tools:
-- navigate(url): Navigate to a URL
-- click(selector): Click an element using CSS selector
-- type(selector, text): Type text into an input field
-- scroll(direction, amount): Scroll the page
-- wait(seconds): Wait for specified seconds
-- extract_text(): Get all visible text from the page
-- get_elements(): Get list of interactive elements
-- screenshot(path): Take a screenshot
-- get_url(): Get current URL
-- wait_for_element(selector, timeout): Wait for element to appear
+Use the provided tools to act on the page. Refer to elements by the handle
+shown in the element list (e.g. @12); handles are valid until the page
+navigates. When several steps are clearly sequential (e.g. type into a
+field, then click a button), call the tools together in one turn; they are
+executed in order. If execute_plan is
+available, prefer it for such sequences and add expectations to the steps
+so that the batch stops as soon as the page does not behave as planned.
 
 Strategy:
 1. First, understand the current page state
@@ -190,78 +452,115 @@ Be thorough but efficient. If something fails, try alternative approaches."""
             self.task_state["iterations"] += 1
             logger.info(f"Iteration {self.task_state['iterations']}/{self.max_iterations}")
             
-            page_state = await self._get_page_state()
-            
-            summary = self.context_manager.create_page_summary(
-                page_state["url"],
-                page_state["page_content"],
-                page_state["interactive_elements"]
+            # Элементы ранжируются по задаче и последнему ответу модели
+            self.context_manager.set_focus(f"{task}\n{assistant_message}")
+            with self.metrics.phase("page_state"):
+                page_state = await self._get_page_state()
+            self.metrics.record_page(
+                len(page_state["page_content"]), len(page_state["interactive_elements"]), page_state["delta"]["full"]
             )
             
-            user_message = f"""{summary}
-
-Task: {task}
-
-Actions taken so far: {', '.join(self.task_state['actions_taken'][-5:]) if self.task_state['actions_taken'] else 'None'}
-
-What should I do next?"""
+            context_started = time.monotonic()
             
-            self.conversation_history.append({
-                "role": "user",
-                "content": user_message
-            })
+            # Итог воспроизведения траектории сообщается модели один раз
+            replay_section = f"\n{replay_note}\n" if replay_note else ""
+            replay_note = None
             
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1500,
-                system=system_prompt,
-                messages=self.conversation_history
+            page_message = self._page_message(task, page_state, pending_results, replay_section)
+            self.conversation_history.append(page_message)
+            observation = self.context_manager.create_observation(
+                page_message, page_state["url"], page_state["title"]
             )
+            self.observations.append(observation)
+            if page_state["delta"]["full"]:
+                baseline_observation = observation
+            
+            if self.context_manager.should_trim_history(self.conversation_history):
+                self.context_manager.compact_history(self.observations, Config.CONTEXT_CONFIG["keep_observations"])
             
-            assistant_message = response.content[0].text
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
+            token_breakdown = self._enforce_budget(system_prompt)
+            if not page_state["delta"]["full"] and (
+                baseline_observation is None
+                or baseline_observation.get("compacted")
+                or not any(message is baseline_observation["message"] for message in self.conversation_history)
+            ):
+                # Полный снимок, к которому относится дельта, сжат или отброшен - модель его уже не увидит
+                logger.info("Delta baseline left the history, sending the full page")
+                self.browser.reset_tracking()
+                with self.metrics.phase("page_state"):
+                    page_state = await self._get_page_state()
+                page_message = self._page_message(task, page_state, pending_results, replay_section)
+                self.conversation_history[-1] = page_message
+                observation["message"] = page_message
+                token_breakdown = self._enforce_budget(system_prompt)
+                baseline_observation = observation
+            observation["message"] = self.conversation_history[-1]
+            logger.info(f"Prompt tokens (estimated): {token_breakdown}")
+            self.metrics.record_phase("context", time.monotonic() - context_started)
+            self.metrics.record_prompt_estimate(token_breakdown["total"])
+            
+            dispatched: List[asyncio.Task] = []
+            dispatched_calls: List[Dict[str, Any]] = []
+            started: Set[str] = set()
+            
+            def dispatch(tool_call: Dict[str, Any]):
+                # Инструменты запускаются по мере поступления, строго по порядку
+                previous = dispatched[-1] if dispatched else None
+                dispatched_calls.append(tool_call)
+                dispatched.append(asyncio.create_task(
+                    self._run_tool_after(previous, tool_call, observation, started)
+                ))
+            
+            try:
+                with self.metrics.phase("llm"):
+                    response = await self._call_model(system_prompt, on_tool_use=dispatch)
+            except asyncio.TimeoutError:
+                self.error_handler.record_error("llm_timeout", f"iteration {self.task_state['iterations']}")
+                finished = await self._finish_started_tools(dispatched, dispatched_calls, started)
+                if finished:
+                    # Действия уже выполнены: в истории остается часть ответа с их вызовами и результатами
+                    self.conversation_history.append({
+                        "role": "assistant",
+                        "content": [
+                            {"type": "tool_use", "id": call["id"], "name": call["name"], "input": call["input"]}
+                            for call, _ in finished
+                        ]
+                    })
+                    pending_results = [result for _, result in finished]
+                    continue
+                self.conversation_history.pop()
+                self.observations.pop()
+                self.browser.reset_tracking()
+                continue
+            except BaseException:
+                await self._cancel_tools(dispatched)
+                raise
+            
+            self.conversation_history.append(response_to_message(response.content))
+            assistant_message = response_text(response.content)
             
             logger.info(f"Agent: {assistant_message[:300]}")
             
-            tool_calls = await self._parse_tool_calls(assistant_message)
+            tool_calls = extract_tool_calls(response.content)
             
             if not tool_calls:
                 if any(phrase in assistant_message.lower() for phrase in ["task completed", "done", "finished", "successfully"]):
                     logger.info("Task completed")
+                    self.task_state["completed"] = True
+                    if self.recorder is not None and self.recorder.steps:
+                        self.trajectory_store.save(self.recorder.to_trajectory())
                     return assistant_message
                 elif self.task_state["iterations"] >= self.max_iterations:
                     return f"Max iterations reached. Summary: {assistant_message}"
                 else:
-                    await asyncio.sleep(1)
+                    pending_results = []
                     continue
             
-            for tool_call in tool_calls:
-                tool_name = tool_call["name"]
-                tool_input = tool_call["input"]
-                
-                is_destructive = await self._check_destructive_action(tool_name, tool_input)
-                if is_destructive:
-                    logger.warning(f"Destructive action: {tool_name}({tool_input})")
-                    user_input = input(f"\n⚠️  Agent wants to: {tool_name}({json.dumps(tool_input)})\nAllow? (y/n): ")
-                    if user_input.lower() != 'y':
-                        self.conversation_history.append({
-                            "role": "user",
-                            "content": "User rejected this action. Try a different approach."
-                        })
-                        continue
-                
-                result = await self._execute_tool(tool_name, tool_input)
-                logger.info(f"Result: {result[:200]}")
-                
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": f"Tool result: {result}"
-                })
-            
-            await asyncio.sleep(0.3)
+            # Инструменты, запущенные во время потока, учитываются здесь только ожиданием их завершения
+            with self.metrics.phase("tools"):
+                pending_results = list(await asyncio.gather(*dispatched))
+                for tool_call in tool_calls[len(dispatched):]:
+                    pending_results.append(await self._handle_tool_call(tool_call, observation))
         
         return f"Max iterations ({self.max_iterations}) reached without completing task"
 
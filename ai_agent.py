@@ -1,9 +1,12 @@
 import asyncio
 import json
 import logging
-from typing import Optional, Dict, Any, List
-from anthropic import Anthropic
+from typing import Optional, Dict, Any
 from browser_controller import BrowserController
+from config import Config
+from context_manager import ContextManager
+from llm_backend import LLMBackend, create_backend, response_deadline
+from tools import TOOL_DEFINITIONS, extract_tool_calls, response_to_message, response_text, tool_result_block
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,16 +15,23 @@ logger = logging.getLogger(__name__)
 class AIAgent:
     """Базовый AI агент для управления браузером"""
     
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
-        self.browser = BrowserController()
+    def __init__(self, api_key: str, browser: Optional[BrowserController] = None,
+                 llm: Optional[LLMBackend] = None):
+        self.llm = llm or create_backend(api_key)
+        self.browser = browser or BrowserController()
+        self.context_manager = ContextManager(
+            max_tokens=Config.CONTEXT_CONFIG["max_tokens"],
+            token_buffer=Config.CONTEXT_CONFIG["token_buffer"]
+        )
         self.conversation_history = []
+        self.observations = []
         self.max_retries = 3
         self.destructive_actions = {"submit", "delete", "remove", "pay", "checkout", "purchase"}
 
     async def initialize(self):
         """Инициализировать агента"""
-        await self.browser.launch()
+        if self.browser.page is None:
+            await self.browser.launch()
 
     async def close(self):
         """Закрыть агента"""
@@ -44,44 +54,22 @@ class AIAgent:
         return result
 
     async def _get_page_state(self) -> Dict[str, Any]:
-        url = await self.browser.get_current_url()
-        text_content = await self.browser.extract_text_content()
-        interactive_elements = await self.browser.get_interactive_elements()
+        snapshot = await self.browser.snapshot()
         
-        compressed_content = self._compress_content(text_content)
+        compressed_content = self._compress_content(snapshot["text"])
+        compressed_content += self.context_manager.describe_text_window(snapshot["window"])
         
         return {
-            "url": url,
+            "url": snapshot["url"],
+            "title": snapshot["title"],
             "page_content": compressed_content,
-            "interactive_elements": interactive_elements[:20]
+            "interactive_elements": self.context_manager.select_elements(snapshot["elements"], 20)
         }
 
-    async def _parse_tool_calls(self, response_text: str) -> List[Dict[str, Any]]:
-        tool_calls = []
-        
-        if "<tool_use" in response_text:
-            import re
-            pattern = r'<tool_use id="([^"]+)" name="([^"]+)">(.*?)</tool_use>'
-            matches = re.findall(pattern, response_text, re.DOTALL)
-            
-            for tool_id, tool_name, tool_input in matches:
-                try:
-                    input_data = json.loads(tool_input.strip())
-                    tool_calls.append({
-                        "id": tool_id,
-                        "name": tool_name,
-                        "input": input_data
-                    })
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to parse tool input: {tool_input}")
-        
-        return tool_calls
-
     async def _execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
         try:
             if tool_name == "navigate":
                 await self.browser.navigate(tool_input["url"])
-                await asyncio.sleep(1)
                 return "Navigation successful"
             
             elif tool_name == "click":
@@ -110,9 +98,13 @@ class AIAgent:
                 text = await self.browser.extract_text_content()
                 return self._compress_content(text, 2000)
             
+            elif tool_name == "read_more":
+                portion = await self.browser.read_text(tool_input.get("cursor"))
+                return self.context_manager.format_text_portion(portion)
+            
             elif tool_name == "get_elements":
                 elements = await self.browser.get_interactive_elements()
-                return json.dumps(elements[:15], indent=2)
+                return json.dumps(self.context_manager.select_elements(elements, 15), indent=2)
             
             elif tool_name == "screenshot":
                 path = tool_input.get("path", "screenshot.png")
@@ -123,6 +115,11 @@ class AIAgent:
                 url = await self.browser.get_current_url()
                 return f"Current URL: {url}"
             
+            elif tool_name == "wait_for_element":
+                selector = tool_input["selector"]
+                await self.browser.wait_for_element(selector, tool_input.get("timeout", 5000))
+                return f"Element appeared: {selector}"
+            
             else:
                 return f"Unknown tool: {tool_name}"
         
@@ -130,11 +127,39 @@ class AIAgent:
             logger.error(f"Tool execution error: {e}")
             return f"Error executing {tool_name}: {str(e)}"
 
+    async def _call_model(self, system_prompt: str):
+        """Запросить ответ модели, не блокируя цикл событий"""
+        system, messages = self.context_manager.build_cached_request(system_prompt, self.conversation_history)
+        response = await asyncio.wait_for(
+            self.llm.complete({
+                "model": Config.LLM_CONFIG["model"],
+                "max_tokens": Config.LLM_CONFIG["max_tokens"],
+                "system": system,
+                "tools": TOOL_DEFINITIONS,
+                "messages": messages
+            }),
+            timeout=response_deadline()
+        )
+        self._record_usage(response.usage)
+        return response
+
+    def _record_usage(self, usage):
+        call_usage = {
+            "input": usage.input_tokens,
+            "output": usage.output_tokens,
+            "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write": getattr(usage, "cache_creation_input_tokens", None) or 0
+        }
+        logger.info(f"LLM usage: {call_usage}")
+
     async def _check_destructive_action(self, tool_name: str, tool_input: Dict[str, Any]) -> bool:
         if tool_name == "click":
-            selector = tool_input.get("selector", "").lower()
+            selector = tool_input.get("selector", "")
+            # Для handle вида @12 проверяются селектор и текст самого элемента
+            elem = self.browser.tracked_element(selector) or {}
+            description = f"{selector} {elem.get('selector', '')} {elem.get('text', '')}".lower()
             for action in self.destructive_actions:
-                if action in selector:
+                if action in description:
                     return True
         return False
 
@@ -142,30 +167,18 @@ class AIAgent:
         logger.info(f"Starting task: {task}")
         
         self.conversation_history = []
+        self.observations = []
+        pending_results = []
+        assistant_message = ""
         
         system_prompt = """You are an AI agent that controls a web browser to complete tasks. 
-You have access to tools to interact with the browser.
-
-Available tools:
-- navigate(url): Navigate to a URL
-- click(selector): Click an element using CSS selector
-- type(selector, text): Type text into an input field
-- scroll(direction, amount): Scroll the page (direction: 'up' or 'down', amount: number of scrolls)
-- wait(seconds): Wait for specified seconds
-- extract_text(): Get all visible text from the page
-- get_elements(): Get list of interactive elements
-- screenshot(path): Take a screenshot
-- get_url(): Get current URL
-
-When you need to use a tool, format it like this:
-<tool_use id="unique_id" name="tool_name">
-{"param1": "value1", "param2": "value2"}
-</tool_use>
+You have access to tools to interact with the browser. You may call several
+tools in one turn; they are executed in order.
 
 Rules:
 1. Always check the current page state before taking action
-2. Use get_elements() to find the right selector to click
-3. Be specific with selectors - use IDs or unique classes when possible
+2. Use get_elements() to find the element to click
+3. Refer to elements by their handle from the element list (e.g. @12)
 4. If an action fails, try alternative approaches
 5. Report your progress and findings
 6. When task is complete, summarize what was accomplished"""
@@ -177,10 +190,13 @@ Rules:
             iteration += 1
             logger.info(f"Iteration {iteration}/{max_iterations}")
             
+            # Элементы ранжируются по задаче и последнему ответу модели
+            self.context_manager.set_focus(f"{task}\n{assistant_message}")
             page_state = await self._get_page_state()
             
             user_message = f"""Current page state:
 URL: {page_state['url']}
+Title: {page_state['title']}
 Page content (first 2000 chars):
 {page_state['page_content']}
 
@@ -191,27 +207,34 @@ Task: {task}
 
 What should I do next?"""
             
-            self.conversation_history.append({
+            page_message = {
                 "role": "user",
-                "content": user_message
-            })
-            
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1500,
-                system=system_prompt,
-                messages=self.conversation_history
+                "content": pending_results + [{"type": "text", "text": user_message}] if pending_results else user_message
+            }
+            self.conversation_history.append(page_message)
+            observation = self.context_manager.create_observation(
+                page_message, page_state["url"], page_state["title"]
             )
+            self.observations.append(observation)
+            
+            if self.context_manager.should_trim_history(self.conversation_history):
+                self.context_manager.compact_history(self.observations, Config.CONTEXT_CONFIG["keep_observations"])
             
-            assistant_message = response.content[0].text
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
+            try:
+                response = await self._call_model(system_prompt)
+            except asyncio.TimeoutError:
+                logger.error("LLM call timed out, retrying on next iteration")
+                self.conversation_history.pop()
+                self.observations.pop()
+                continue
+            
+            pending_results = []
+            self.conversation_history.append(response_to_message(response.content))
+            assistant_message = response_text(response.content)
             
             logger.info(f"Agent response: {assistant_message[:500]}")
             
-            tool_calls = await self._parse_tool_calls(assistant_message)
+            tool_calls = extract_tool_calls(response.content)
             
             if not tool_calls:
                 if "task completed" in assistant_message.lower() or "done" in assistant_message.lower():
@@ -220,7 +243,6 @@ What should I do next?"""
                 elif iteration >= max_iterations:
                     return f"Max iterations reached. Last response: {assistant_message}"
                 else:
-                    await asyncio.sleep(1)
                     continue
             
             for tool_call in tool_calls:
@@ -230,24 +252,25 @@ What should I do next?"""
                 is_destructive = await self._check_destructive_action(tool_name, tool_input)
                 if is_destructive:
                     logger.warning(f"Destructive action detected: {tool_name} with {tool_input}")
-                    user_input = input(f"Agent wants to execute: {tool_name}({tool_input}). Allow? (y/n): ")
+                    user_input = await asyncio.get_running_loop().run_in_executor(
+                        None, input, f"Agent wants to execute: {tool_name}({tool_input}). Allow? (y/n): "
+                    )
                     if user_input.lower() != 'y':
                         logger.info("User rejected destructive action")
-                        self.conversation_history.append({
-                            "role": "user",
-                            "content": "User rejected this action. Try a different approach."
-                        })
+                        pending_results.append(tool_result_block(
+                            tool_call["id"], "User rejected this action. Try a different approach.", is_error=True
+                        ))
+                        observation["actions"].append(f"{tool_name} (rejected)")
                         continue
                 
                 result = await self._execute_tool(tool_name, tool_input)
                 logger.info(f"Tool result: {result}")
                 
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": f"Tool execution result: {result}"
-                })
-            
-            await asyncio.sleep(0.5)
+                pending_results.append(tool_result_block(
+                    tool_call["id"], result, is_error=result.startswith(f"Error executing {tool_name}")
+                ))
+                observation["actions"].append(f"{tool_name}({json.dumps(tool_input, ensure_ascii=False)[:80]})")
+                observation["outcomes"].append(result)
         
         return "Max iterations reached without completing task"
 
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional, Tuple
+from cdp_engine import CDPSnapshotEngine
+
+# Роли, которые считаются интерактивными независимо от фокусируемости
+INTERACTIVE_ROLES = {
+    "button", "link", "textbox", "searchbox", "combobox", "listbox", "option",
+    "checkbox", "radio", "switch", "slider", "spinbutton", "tab",
+    "menuitem", "menuitemcheckbox", "menuitemradio", "treeitem"
+}
+
+# Фокусируемые узлы этих ролей - контейнеры страницы, а не элементы управления
+_CONTAINER_ROLES = {"RootWebArea", "WebArea", "Iframe", "ScrollArea", "document", "main", "dialog"}
+
+# Состояния, которые показываются модели рядом с ролью
+_STATE_PROPERTIES = ("disabled", "checked", "expanded", "selected", "pressed", "required", "invalid")
+
+
+def _ax_value(field: Optional[Dict[str, Any]]) -> Any:
+    return (field or {}).get("value")
+
+
+def _role_selector(role: str, name: str) -> str:
+    if not name:
+        return f"role={role}"
+    escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+    return f'role={role}[name="{escaped}"s]'
+
+
+def parse_ax_tree(nodes: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Разобрать плоский список узлов Accessibility.getFullAXTree в текст и элементы
+
+    Элементы получают handle = backendDOMNodeId и селектор Playwright по
+    роли и имени (одинаковые различаются через nth); селектор нужен для
+    записи траекторий, действия выполняются по handle через locate.
+    """
+    parts: List[str] = []
+    elements: List[Dict[str, Any]] = []
+    selector_counts: Dict[str, int] = {}
+
+    for node in nodes:
+        if node.get("ignored"):
+            continue
+        role = _ax_value(node.get("role")) or ""
+        name = str(_ax_value(node.get("name")) or "").strip()
+        if role == "StaticText":
+            if name:
+                parts.append(name)
+            continue
+
+        properties = {prop["name"]: _ax_value(prop.get("value")) for prop in node.get("properties", [])}
+        interactive = role in INTERACTIVE_ROLES or (
+            properties.get("focusable") and role not in _CONTAINER_ROLES and name
+        )
+        if not interactive or "backendDOMNodeId" not in node:
+            continue
+
+        base_selector = _role_selector(role, name)
+        index = selector_counts.get(base_selector, 0)
+        selector_counts[base_selector] = index + 1
+        state = [prop for prop in _STATE_PROPERTIES if properties.get(prop) not in (None, False, "false")]
+        elements.append({
+            "handle": node["backendDOMNodeId"],
+            "selector": base_selector,
+            "nth": index,
+            "role": role,
+            "text": name[:50],
+            "type": role,
+            "placeholder": "",
+            "state": ",".join(state),
+            "visible": True
+        })
+
+    # nth нужен только там, где селектор неоднозначен
+    for elem in elements:
+        if selector_counts[elem["selector"]] > 1:
+            elem["selector"] = f"{elem['selector']} >> nth={elem['nth']}"
+        del elem["nth"]
+    return "\n".join(parts), elements
+
+
+class AXSnapshotEngine(CDPSnapshotEngine):
+    """Снимок страницы по дереву доступности Chromium за один вызов CDP
+
+    Дерево уже учитывает видимость (скрытые узлы помечены ignored) и
+    содержит пользовательские виджеты с ARIA ролями, поэтому обход DOM
+    с getBoundingClientRect не нужен.
+    """
+
+    domains = ("Accessibility",)
+
+    async def capture(self) -> Dict[str, Any]:
+        """Получить текст и интерактивные элементы страницы"""
+        cdp = await self._cdp()
+        tree = await cdp.send("Accessibility.getFullAXTree")
+        text, elements = parse_ax_tree(tree["nodes"])
+        return {"text": text, "elements": elements}
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+from advanced_agent import AdvancedAIAgent
+from browser_pool import BrowserPool
+from llm_backend import CachingBackend, create_backend
+from metrics import MetricsExporter
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRunner:
+    """Пакетное выполнение задач из JSONL с параллельностью и возобновлением
+
+    Каждая строка входного файла - объект {"id": ..., "task": ...}. Результаты
+    пишутся в выходной JSONL по мере завершения задач; при resume задачи,
+    уже завершенные в выходном файле, пропускаются.
+    """
+
+    def __init__(self, api_key: str, concurrency: int = 4, resume: bool = False):
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.resume = resume
+        self.pool: Optional[BrowserPool] = None
+        self.metrics_exporter = MetricsExporter.from_config()
+        # Один бэкенд на пакет: общие соединения с API и общий кэш ответов
+        self.llm = create_backend(api_key)
+        self._write_lock = asyncio.Lock()
+
+    @staticmethod
+    def load_tasks(path: str) -> List[Dict[str, str]]:
+        """Прочитать задачи из JSONL файла или из stdin, если путь равен '-'"""
+        if path == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+
+        tasks = []
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "task" not in record:
+                raise ValueError(f"Строка {line_no}: отсутствует поле 'task'")
+            tasks.append({
+                "id": str(record.get("id", f"line-{line_no}")),
+                "task": record["task"]
+            })
+        return tasks
+
+    @staticmethod
+    def load_completed_ids(path: str) -> Set[str]:
+        """Получить ID задач, успешно завершенных в выходном файле"""
+        completed = set()
+        if not os.path.exists(path):
+            return completed
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Последняя строка могла оборваться при прерывании
+                    continue
+                if record.get("status") == "completed":
+                    completed.add(str(record["id"]))
+        return completed
+
+    async def run(self, tasks_path: str, output_path: str) -> Dict[str, Any]:
+        """Выполнить все задачи и вернуть сводку по пакету"""
+        tasks = self.load_tasks(tasks_path)
+        if self.resume:
+            completed = self.load_completed_ids(output_path)
+            skipped = len([t for t in tasks if t["id"] in completed])
+            tasks = [t for t in tasks if t["id"] not in completed]
+            logger.info(f"Возобновление: пропущено {skipped} завершенных задач")
+        else:
+            skipped = 0
+            open(output_path, "w", encoding="utf-8").close()
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in tasks:
+            queue.put_nowait(task)
+
+        summary = {"total": len(tasks), "skipped": skipped, "completed": 0, "incomplete": 0, "failed": 0}
+        started = time.monotonic()
+
+        self.pool = BrowserPool(max_concurrency=self.concurrency)
+        await self.pool.start()
+        try:
+            with open(output_path, "a", encoding="utf-8") as output:
+                workers = [
+                    asyncio.create_task(self._worker(queue, output, summary))
+                    for _ in range(min(self.concurrency, len(tasks)) or 1)
+                ]
+                await asyncio.gather(*workers)
+        finally:
+            summary["pool"] = self.pool.get_stats()
+            await self.pool.close()
+
+        summary["duration_seconds"] = round(time.monotonic() - started, 3)
+        if isinstance(self.llm, CachingBackend):
+            summary["llm_cache"] = self.llm.cache.summary()
+        return summary
+
+    async def _worker(self, queue: asyncio.Queue, output, summary: Dict[str, Any]):
+        while not queue.empty():
+            task = queue.get_nowait()
+            record = await self._run_task(task)
+            summary[record["status"]] += 1
+            async with self._write_lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+            logger.info(f"Задача {task['id']}: {record['status']} за {record['duration_seconds']} с")
+
+    async def _run_task(self, task: Dict[str, str]) -> Dict[str, Any]:
+        record = {
+            "id": task["id"],
+            "task": task["task"],
+            "started_at": time.time()
+        }
+        started = time.monotonic()
+
+        agent: Optional[AdvancedAIAgent] = None
+        # Ошибка выдачи браузера из пула тоже записывается как failed, а не останавливает пакет
+        try:
+            async with self.pool.lease() as browser:
+                agent = AdvancedAIAgent(self.api_key, browser=browser, interactive=False,
+                                        metrics_exporter=self.metrics_exporter, llm=self.llm)
+                try:
+                    await agent.initialize()
+                    record["result"] = await agent.execute_task(task["task"], task_id=task["id"])
+                    # Исчерпанные итерации или таймауты модели - не завершение: при resume задача повторится
+                    record["status"] = "completed" if agent.task_state["completed"] else "incomplete"
+                finally:
+                    await agent.close()
+        except Exception as e:
+            logger.error(f"Задача {task['id']} завершилась с ошибкой: {e}")
+            record["error"] = str(e)
+            record["status"] = "failed"
+
+        if agent is not None:
+            record["iterations"] = agent.task_state["iterations"]
+            record["replayed_steps"] = agent.task_state["replayed_steps"]
+            record["metrics"] = agent.metrics.to_dict()
+        record["duration_seconds"] = round(time.monotonic() - started, 3)
+        return record
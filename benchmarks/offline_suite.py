@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Офлайн бенчмарк агента: локальные страницы и детерминированная модель
+
+Страницы из benchmarks/fixtures раздаются локальным HTTP сервером,
+AdvancedAIAgent работает в headless Chromium, а вместо API Anthropic
+бэкендом модели служит ScriptedModel с заранее записанным сценарием.
+Сеть и ключ API не нужны, поэтому замеры повторяемы и подходят для CI.
+
+Использование:
+    python benchmarks/offline_suite.py
+    python benchmarks/offline_suite.py --scenarios search,table --runs 5 --engine ax
+    python benchmarks/offline_suite.py --model-latency 0.8 --json results.json
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import statistics
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anthropic.types import Message
+from playwright.async_api import async_playwright
+from advanced_agent import AdvancedAIAgent
+from browser_controller import BrowserController, launch_browser, prepare_context
+from config import Config
+from context_manager import ContextManager
+from llm_backend import LLMBackend, ToolUseCallback
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def navigate(path: str) -> Dict[str, Any]:
+    return {"name": "navigate", "input": {"url": "{base}/" + path}}
+
+
+def click(selector: str) -> Dict[str, Any]:
+    return {"name": "click", "input": {"selector": selector}}
+
+
+def type_text(selector: str, text: str) -> Dict[str, Any]:
+    return {"name": "type", "input": {"selector": selector, "text": text}}
+
+
+def scroll(direction: str = "down", amount: int = 5) -> Dict[str, Any]:
+    return {"name": "scroll", "input": {"direction": direction, "amount": amount}}
+
+
+def tool(name: str, **tool_input) -> Dict[str, Any]:
+    return {"name": name, "input": tool_input}
+
+
+# Каждый ход модели - список вызовов инструментов; пустой ход завершает задачу.
+# expect - текст, который должен оказаться на странице после выполнения.
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "search": {
+        "task": "Найди в магазине ноутбуки и сообщи, сколько товаров нашлось",
+        "expect": "Найдено 40 товаров",
+        "turns": [
+            [navigate("search.html")],
+            [type_text("#q", "ноутбук"), click("#search-button")],
+            [tool("extract_text")],
+            []
+        ]
+    },
+    "feed": {
+        "task": "Пролистай ленту новостей и найди пост номер 40",
+        "expect": "Пост 40",
+        "turns": [
+            [navigate("feed.html")],
+            [scroll(amount=5)],
+            [scroll(amount=5)],
+            [tool("read_more")],
+            []
+        ]
+    },
+    "table": {
+        "task": "Найди в прайс-листе остаток товара SKU-01234",
+        "expect": "SKU-01234",
+        "turns": [
+            [navigate("table.html")],
+            [type_text("#filter", "SKU-01234")],
+            [tool("extract_text")],
+            []
+        ]
+    },
+    "checkout": {
+        "task": "Оформи заказ из корзины с доставкой курьером на имя Иван Петров",
+        "expect": "Номер заказа",
+        "turns": [
+            [navigate("cart.html")],
+            [click("#to-shipping")],
+            [tool("execute_plan", steps=[
+                {"tool": "type", "input": {"selector": "#name", "text": "Иван Петров"}},
+                {"tool": "type", "input": {"selector": "#address", "text": "Москва, ул. Пушкина, 1"}},
+                {"tool": "click", "input": {"selector": "#continue"}, "expect": {"url_contains": "payment.html"}}
+            ])],
+            [type_text("#card", "4111 1111 1111 1111"), click("#place-order")],
+            []
+        ]
+    },
+    "heavy_dom": {
+        "task": "Открой виджет 450 на панели управления",
+        "expect": "Открыт Открыть 450",
+        "turns": [
+            [navigate("heavy.html")],
+            [tool("get_elements")],
+            [click('[data-testid="widget-450"]')],
+            []
+        ]
+    }
+}
+
+
+class ScriptedModel(LLMBackend):
+    """Детерминированная модель: отвечает ходами сценария по порядку
+
+    Входные токены оцениваются по фактическому запросу, поэтому отражают
+    размер контекста, который агент отправил бы модели.
+    """
+
+    def __init__(self, turns: List[List[Dict[str, Any]]], base_url: str, latency: float = 0.0):
+        self.turns = json.loads(json.dumps(turns).replace("{base}", base_url))
+        self.latency = latency
+        self.calls = 0
+        self._context_manager = ContextManager()
+
+    def _next_message(self, request: Dict[str, Any]) -> Message:
+        if self.calls >= len(self.turns):
+            raise RuntimeError("Сценарий модели закончился раньше задачи")
+        turn = self.turns[self.calls]
+        self.calls += 1
+
+        if turn:
+            content = [{"type": "text", "text": f"Step {self.calls}."}] + [
+                {"type": "tool_use", "id": f"toolu_{self.calls}_{i}", "name": call["name"], "input": call["input"]}
+                for i, call in enumerate(turn)
+            ]
+        else:
+            content = [{"type": "text", "text": "Task completed."}]
+        prompt = json.dumps([request["system"], request["tools"], request["messages"]], ensure_ascii=False)
+        return Message.model_validate({
+            "id": f"msg_scripted_{self.calls}",
+            "type": "message",
+            "role": "assistant",
+            "model": request["model"],
+            "content": content,
+            "stop_reason": "tool_use" if turn else "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": self._context_manager.estimate_tokens(prompt),
+                "output_tokens": self._context_manager.estimate_tokens(json.dumps(content, ensure_ascii=False))
+            }
+        })
+
+    async def complete(self, request: Dict[str, Any]) -> Message:
+        await asyncio.sleep(self.latency)
+        return self._next_message(request)
+
+    async def stream(self, request: Dict[str, Any], on_tool_use: Optional[ToolUseCallback] = None) -> Message:
+        message = self._next_message(request)
+        for block in message.content:
+            # Задержка модели распределяется по блокам ответа, как при реальном потоке
+            await asyncio.sleep(self.latency / len(message.content))
+            if block.type == "tool_use" and on_tool_use is not None:
+                on_tool_use({"id": block.id, "name": block.name, "input": block.input})
+        return message
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server() -> ThreadingHTTPServer:
+    """Запустить HTTP сервер страниц сценариев на свободном порту 127.0.0.1"""
+    handler = functools.partial(_QuietHandler, directory=FIXTURES_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_scenario(browser, name: str, base_url: str, latency: float) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    context = await browser.new_context()
+    await prepare_context(context)
+    controller = BrowserController()
+    await controller.attach(context, owns_context=True)
+    agent = AdvancedAIAgent("offline", browser=controller, interactive=False,
+                            llm=ScriptedModel(scenario["turns"], base_url, latency))
+    try:
+        await agent.initialize()
+        try:
+            await agent.execute_task(scenario["task"])
+            passed = agent.task_state["completed"] and await controller.contains_text(scenario["expect"])
+        except Exception as e:
+            print(f"  {name}: {e}", file=sys.stderr)
+            passed = False
+        return {"scenario": name, "passed": passed, "report": agent.metrics.to_dict()}
+    finally:
+        await agent.close()
+
+
+def summarize(name: str, runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    reports = [run["report"] for run in runs]
+
+    def median(values):
+        return round(statistics.median(values), 3)
+
+    def phase_seconds(report, phase):
+        return report["phases"].get(phase, {}).get("total_seconds", 0.0)
+
+    return {
+        "scenario": name,
+        "passed": all(run["passed"] for run in runs),
+        "runs": len(runs),
+        "latency_s": median([r["duration_seconds"] for r in reports]),
+        "iterations": median([r["iterations"] for r in reports]),
+        "extraction_s": median([phase_seconds(r, "page_state") for r in reports]),
+        "llm_s": median([phase_seconds(r, "llm") for r in reports]),
+        "tools_s": median([phase_seconds(r, "tools") for r in reports]),
+        "settle_s": median([r["settle"]["total_seconds"] for r in reports]),
+        "prompt_tokens": median([r["tokens"]["input"] for r in reports]),
+        "page_chars": median([r["pages"]["text_chars"] for r in reports]),
+        "reports": reports
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк агента на локальных страницах")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую")
+    parser.add_argument("--runs", type=int, default=3, help="Повторов каждого сценария")
+    parser.add_argument("--engine", default=Config.SNAPSHOT_CONFIG["engine"], help="Движок снимков страницы")
+    parser.add_argument("--model-latency", type=float, default=0.0,
+                        help="Имитация задержки модели на один ответ, секунды")
+    parser.add_argument("--no-streaming", action="store_true", help="Запрашивать ответ модели целиком")
+    parser.add_argument("--json", help="Сохранить сводку и отчеты прогонов в файл")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",")
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+
+    Config.BROWSER_CONFIG["headless"] = True
+    Config.SNAPSHOT_CONFIG["engine"] = args.engine
+    Config.LLM_CONFIG["streaming"] = not args.no_streaming
+    # Воспроизведение траекторий сделало бы повторные прогоны несопоставимыми
+    Config.TRAJECTORY_CONFIG["enabled"] = False
+
+    server = start_fixture_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    playwright = await async_playwright().start()
+    browser = await launch_browser(playwright)
+    results = []
+    try:
+        for name in names:
+            runs = [await run_scenario(browser, name, base_url, args.model_latency) for _ in range(args.runs)]
+            results.append(summarize(name, runs))
+    finally:
+        await browser.close()
+        await playwright.stop()
+        server.shutdown()
+
+    print(f"\nengine={args.engine} streaming={not args.no_streaming} "
+          f"model_latency={args.model_latency}s runs={args.runs} (медианы)")
+    print(f"{'scenario':<12}{'ok':>4}{'latency s':>11}{'iter':>6}{'extract s':>11}{'llm s':>8}"
+          f"{'tools s':>9}{'settle s':>10}{'prompt tok':>12}{'page chars':>12}")
+    for r in results:
+        print(f"{r['scenario']:<12}{'yes' if r['passed'] else 'NO':>4}{r['latency_s']:>11}{r['iterations']:>6}"
+              f"{r['extraction_s']:>11}{r['llm_s']:>8}{r['tools_s']:>9}{r['settle_s']:>10}"
+              f"{r['prompt_tokens']:>12}{r['page_chars']:>12}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"engine": args.engine, "streaming": not args.no_streaming,
+                       "model_latency": args.model_latency, "results": results}, f, ensure_ascii=False, indent=2)
+
+    return 0 if all(r["passed"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
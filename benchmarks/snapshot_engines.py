@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Сравнение движков снимков страницы: задержка snapshot() и размер наблюдения в токенах
+
+Использование:
+    python benchmarks/snapshot_engines.py                  # синтетическая страница
+    python benchmarks/snapshot_engines.py https://example.com --runs 10
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.async_api import async_playwright
+from browser_controller import BrowserController, launch_browser, prepare_context
+from config import Config
+from context_manager import ContextManager
+
+ENGINES = ["js", "ax", "domsnapshot"]
+
+
+def synthetic_page(items: int = 2000) -> str:
+    """Длинная страница с обычными элементами и пользовательскими виджетами"""
+    rows = []
+    for i in range(items):
+        rows.append(
+            f'<div class="row"><h3>Товар {i}</h3><p>Описание товара номер {i}, доставка завтра.</p>'
+            f'<button class="btn">Купить</button> <a href="#item-{i}">Подробнее</a> '
+            f'<div role="switch" tabindex="0" aria-checked="false">Избранное {i}</div></div>'
+        )
+    return f"<html><head><title>Каталог</title></head><body><input name='q' placeholder='Поиск'>{''.join(rows)}</body></html>"
+
+
+async def measure(context, engine: str, target: str, runs: int) -> dict:
+    Config.SNAPSHOT_CONFIG["engine"] = engine
+    browser = BrowserController()
+    await browser.attach(context)
+    try:
+        if target.startswith("http"):
+            await browser.navigate(target)
+        else:
+            await browser.page.set_content(target)
+
+        timings = []
+        snapshot = None
+        for _ in range(runs):
+            browser.invalidate_cache()
+            started = time.perf_counter()
+            snapshot = await browser.snapshot()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        context_manager = ContextManager()
+        summary = context_manager.create_page_summary(
+            snapshot["url"], snapshot["text"], snapshot["elements"], title=snapshot["title"], delta=dict(snapshot, full=True)
+        )
+        all_elements = context_manager.format_elements_for_context(snapshot["elements"], len(snapshot["elements"]))
+        return {
+            "engine": engine,
+            "median_ms": round(statistics.median(timings), 1),
+            "p90_ms": round(statistics.quantiles(timings, n=10)[-1] if len(timings) > 1 else timings[0], 1),
+            "elements": len(snapshot["elements"]),
+            "text_tokens": context_manager.estimate_tokens(snapshot["text"]),
+            "elements_tokens": context_manager.estimate_tokens(all_elements),
+            "summary_tokens": context_manager.estimate_tokens(summary)
+        }
+    finally:
+        await browser.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движков снимков страницы")
+    parser.add_argument("urls", nargs="*", help="Страницы для замера (по умолчанию синтетическая)")
+    parser.add_argument("--runs", type=int, default=5, help="Количество снимков на движок")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Движки через запятую")
+    args = parser.parse_args()
+
+    targets = args.urls or [synthetic_page()]
+    playwright = await async_playwright().start()
+    browser = await launch_browser(playwright)
+    try:
+        for target in targets:
+            print(f"\n{target if target.startswith('http') else 'синтетическая страница'}")
+            print(f"{'engine':<12}{'median ms':>10}{'p90 ms':>10}{'elements':>10}"
+                  f"{'text tok':>10}{'elem tok':>10}{'summary tok':>12}")
+            for engine in args.engines.split(","):
+                context = await browser.new_context()
+                await prepare_context(context)
+                try:
+                    r = await measure(context, engine, target, args.runs)
+                finally:
+                    await context.close()
+                print(f"{r['engine']:<12}{r['median_ms']:>10}{r['p90_ms']:>10}{r['elements']:>10}"
+                      f"{r['text_tokens']:>10}{r['elements_tokens']:>10}{r['summary_tokens']:>12}")
+    finally:
+        await browser.close()
+        await playwright.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
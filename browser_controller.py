@@ -3,10 +3,405 @@ from typing import Optional, Dict, List, Any
 from playwright.async_api import async_playwright, Browser, Page, BrowserContext
 import json
 import logging
+import re
+import time
+from ax_snapshot import AXSnapshotEngine
+from config import Config
+from dom_snapshot import DOMSnapshotEngine
+from resource_blocker import ResourceBlocker
+from settle_engine import SettleEngine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Handle элемента из снимка страницы, например @12
+_HANDLE_RE = re.compile(r"^@(\d+)$")
+
+# Трекер изменений DOM: счетчик версий и "грязные" поддеревья.
+# Устанавливается как init-скрипт и лениво из скриптов снимков.
+_DOM_TRACKER_JS = """
+(() => {
+    if (window.__agentDom) {
+        return;
+    }
+    const state = {
+        version: 0,
+        dirty: new Set(),
+        handles: new WeakMap(),
+        nextHandle: 1,
+        seen: new Map(),
+        baseline: false,
+        baselineScroll: 0,
+        lastMutation: 0
+    };
+    const observer = new MutationObserver((mutations) => {
+        state.version += 1;
+        state.lastMutation = performance.now();
+        for (const m of mutations) {
+            const target = m.target.nodeType === Node.ELEMENT_NODE ? m.target : m.target.parentElement;
+            if (target) {
+                state.dirty.add(target);
+            }
+        }
+    });
+    observer.observe(document, {
+        childList: true,
+        subtree: true,
+        characterData: true,
+        attributes: true,
+        attributeFilter: ['class', 'style', 'hidden', 'disabled', 'open', 'aria-hidden', 'aria-expanded']
+    });
+    window.__agentDom = state;
+})();
+"""
+
+# Общие функции сбора данных, встраиваемые в скрипты page.evaluate
+_PAGE_HELPERS_JS = _DOM_TRACKER_JS + """
+const tracker = window.__agentDom;
+
+const handleOf = (el) => {
+    let handle = tracker.handles.get(el);
+    if (!handle) {
+        handle = tracker.nextHandle++;
+        tracker.handles.set(el, handle);
+    }
+    // Атрибут не входит в attributeFilter трекера и не помечает DOM измененным
+    if (el.getAttribute('data-agent-handle') !== String(handle)) {
+        el.setAttribute('data-agent-handle', String(handle));
+    }
+    return handle;
+};
+
+const STABLE_ATTRIBUTES = ['data-testid', 'data-test', 'data-qa', 'name', 'aria-label', 'placeholder'];
+
+// Число совпадений для #id и tag[attr=value] по всему документу, строится
+// один раз за вызов скрипта, чтобы не запускать querySelectorAll на каждый элемент
+let selectorCounts = null;
+
+const isUnique = (key) => {
+    if (!selectorCounts) {
+        selectorCounts = new Map();
+        const bump = (k) => selectorCounts.set(k, (selectorCounts.get(k) || 0) + 1);
+        for (const el of document.querySelectorAll('[id]')) {
+            bump(`#${el.id}`);
+        }
+        for (const el of document.querySelectorAll(STABLE_ATTRIBUTES.map(attr => `[${attr}]`).join(','))) {
+            const tag = el.tagName.toLowerCase();
+            for (const attr of STABLE_ATTRIBUTES) {
+                const value = el.getAttribute(attr);
+                if (value) {
+                    bump(`${tag}[${attr}=${value}]`);
+                }
+            }
+        }
+    }
+    return selectorCounts.get(key) === 1;
+};
+
+// Путь из :nth-of-type от ближайшего предка с уникальным id
+const nthOfTypePath = (el) => {
+    const parts = [];
+    let node = el;
+    while (node && node !== document.documentElement) {
+        if (node !== el && node.id && isUnique(`#${node.id}`)) {
+            parts.unshift(`#${CSS.escape(node.id)}`);
+            return parts.join(' > ');
+        }
+        let index = 1;
+        for (let sibling = node.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+            if (sibling.tagName === node.tagName) {
+                index++;
+            }
+        }
+        parts.unshift(`${node.tagName.toLowerCase()}:nth-of-type(${index})`);
+        node = node.parentElement;
+    }
+    parts.unshift('html');
+    return parts.join(' > ');
+};
+
+const uniqueSelector = (el) => {
+    if (el.id && isUnique(`#${el.id}`)) {
+        return `#${CSS.escape(el.id)}`;
+    }
+    const tag = el.tagName.toLowerCase();
+    for (const attr of STABLE_ATTRIBUTES) {
+        const value = el.getAttribute(attr);
+        if (value && isUnique(`${tag}[${attr}=${value}]`)) {
+            return `${tag}[${attr}="${CSS.escape(value)}"]`;
+        }
+    }
+    return nthOfTypePath(el);
+};
+
+const INPUT_ROLES = {
+    checkbox: 'checkbox', radio: 'radio', submit: 'button', button: 'button', reset: 'button', search: 'searchbox'
+};
+
+const roleOf = (el) => {
+    const explicit = el.getAttribute('role');
+    if (explicit) {
+        return explicit;
+    }
+    const tag = el.tagName.toLowerCase();
+    if (tag === 'a') {
+        return 'link';
+    }
+    if (tag === 'input') {
+        return INPUT_ROLES[(el.getAttribute('type') || '').toLowerCase()] || 'textbox';
+    }
+    return {button: 'button', select: 'combobox', textarea: 'textbox'}[tag] || tag;
+};
+
+const nameOf = (el) => (
+    el.getAttribute('aria-label') || el.textContent.trim() || el.getAttribute('placeholder')
+    || el.getAttribute('title') || el.getAttribute('value') || ''
+).substring(0, 50);
+
+// Полоса вокруг окна просмотра (в координатах окна) с запасом margin высот окна
+const viewportBand = (margin) => {
+    const height = window.innerHeight;
+    return {top: -margin * height, bottom: height + margin * height};
+};
+
+const bandWindow = (band) => ({
+    start: Math.max(0, Math.round(window.scrollY + band.top)),
+    end: Math.round(window.scrollY + band.bottom),
+    page_height: document.documentElement.scrollHeight
+});
+
+// Фильтр обхода: поддеревья вне полосы отбрасываются целиком, текст
+// относится к полосе по верхнему краю, невидимый текст пропускается
+const bandFilter = (band) => ({
+    acceptNode: (node) => {
+        if (node.nodeType === Node.ELEMENT_NODE) {
+            const rect = node.getBoundingClientRect();
+            if (rect.height > 0 && (rect.bottom < band.top || rect.top >= band.bottom)) {
+                return NodeFilter.FILTER_REJECT;
+            }
+            return NodeFilter.FILTER_SKIP;
+        }
+        const range = document.createRange();
+        range.selectNodeContents(node);
+        const rect = range.getBoundingClientRect();
+        if (rect.width === 0 && rect.height === 0) {
+            return NodeFilter.FILTER_REJECT;
+        }
+        return rect.top >= band.top && rect.top < band.bottom ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_REJECT;
+    }
+});
+
+const collectText = (root = document.body || document.documentElement, band = null) => {
+    const walker = band
+        ? document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, bandFilter(band))
+        : document.createTreeWalker(root, NodeFilter.SHOW_TEXT, null, false);
+    const parts = [];
+    let node;
+    while (node = walker.nextNode()) {
+        const trimmed = node.textContent.trim();
+        if (trimmed) {
+            parts.push(trimmed);
+        }
+    }
+    return parts.join('\\n');
+};
+
+const INTERACTIVE_SELECTOR = 'button, a, input, select, textarea, [role="button"]';
+const MAX_ELEMENTS = 500;
+
+const scanElements = (root = document) => {
+    const found = [];
+    const viewportHeight = window.innerHeight;
+    const candidates = Array.from(root.querySelectorAll(INTERACTIVE_SELECTOR));
+    if (root.matches && root.matches(INTERACTIVE_SELECTOR)) {
+        candidates.unshift(root);
+    }
+
+    for (const el of candidates) {
+        const rect = el.getBoundingClientRect();
+        if (rect.width > 0 && rect.height > 0) {
+            found.push({
+                el: el,
+                data: {
+                    handle: handleOf(el),
+                    selector: uniqueSelector(el),
+                    role: roleOf(el),
+                    text: nameOf(el),
+                    type: el.getAttribute('type') || el.tagName.toLowerCase(),
+                    placeholder: el.getAttribute('placeholder') || '',
+                    visible: rect.top < viewportHeight && rect.bottom > 0,
+                    y: Math.round(rect.top + window.scrollY)
+                }
+            });
+            // Отбор по релевантности задаче делает ElementRanker; здесь только защита от гигантских страниц
+            if (found.length >= MAX_ELEMENTS) {
+                break;
+            }
+        }
+    }
+    return found;
+};
+
+const collectElements = (root = document) => scanElements(root).map(item => item.data);
+"""
+
+_SNAPSHOT_JS = f"""
+(margin) => {{
+    {_PAGE_HELPERS_JS}
+    const scanned = scanElements();
+    const band = viewportBand(margin);
+    tracker.seen = new Map(scanned.map(item => [item.data.handle, item.el]));
+    tracker.dirty.clear();
+    tracker.baseline = true;
+    tracker.baselineScroll = Math.round(window.scrollY);
+    return {{
+        url: location.href,
+        title: document.title,
+        version: tracker.version,
+        scroll: tracker.baselineScroll,
+        text: collectText(undefined, band),
+        window: bandWindow(band),
+        elements: scanned.map(item => item.data)
+    }};
+}}
+"""
+
+# Изменения с прошлого снимка: текст и элементы только из "грязных" поддеревьев.
+# Возвращает null, если дешевле снять страницу целиком или страница прокручена
+# (тогда в окно попал другой текст).
+_DELTA_JS = f"""
+(margin) => {{
+    {_PAGE_HELPERS_JS}
+    if (!tracker.baseline || Math.round(window.scrollY) !== tracker.baselineScroll) {{
+        return null;
+    }}
+    if (tracker.dirty.size === 0) {{
+        return {{url: location.href, version: tracker.version, unchanged: true}};
+    }}
+    const dirty = new Set(Array.from(tracker.dirty).filter(el => el.isConnected));
+    const body = document.body || document.documentElement;
+    const roots = [];
+    for (const el of dirty) {{
+        let parent = el.parentElement;
+        while (parent && !dirty.has(parent)) {{
+            parent = parent.parentElement;
+        }}
+        if (!parent) {{
+            if (el === body || el === document.documentElement) {{
+                return null;
+            }}
+            roots.push(el);
+        }}
+    }}
+    if (roots.length > 100) {{
+        return null;
+    }}
+
+    const added = [];
+    const updated = [];
+    const present = new Set();
+    for (const root of roots) {{
+        for (const item of scanElements(root)) {{
+            const handle = item.data.handle;
+            present.add(handle);
+            (tracker.seen.has(handle) ? updated : added).push(item.data);
+            tracker.seen.set(handle, item.el);
+        }}
+    }}
+    const removed = [];
+    for (const [handle, el] of tracker.seen) {{
+        const gone = !el.isConnected || (!present.has(handle) && roots.some(root => root.contains(el)));
+        if (gone) {{
+            removed.push(handle);
+            tracker.seen.delete(handle);
+        }}
+    }}
+    tracker.dirty.clear();
+
+    return {{
+        url: location.href,
+        title: document.title,
+        version: tracker.version,
+        text: roots.map(root => collectText(root, viewportBand(margin))).filter(Boolean).join('\\n'),
+        added: added,
+        updated: updated,
+        removed: removed
+    }};
+}}
+"""
+
+# Дешевая проверка версии DOM и прокрутки для кэша снимков
+_DOM_VERSION_JS = """
+() => window.__agentDom && window.__agentDom.baseline
+    ? [window.__agentDom.version, Math.round(window.scrollY)]
+    : null
+"""
+
+# Текст полосы документа [cursor, cursor + высота окна с запасом) без прокрутки
+_READ_TEXT_JS = f"""
+([cursor, margin]) => {{
+    {_PAGE_HELPERS_JS}
+    const height = window.innerHeight * (1 + 2 * margin);
+    const band = {{top: cursor - window.scrollY, bottom: cursor + height - window.scrollY}};
+    return {{
+        text: collectText(undefined, band),
+        start: cursor,
+        end: Math.round(cursor + height),
+        page_height: document.documentElement.scrollHeight
+    }};
+}}
+"""
+
+# URL, заголовок и версия DOM для снимков, снятых через CDP, а не скриптом страницы
+_PAGE_INFO_JS = f"""
+() => {{
+    {_DOM_TRACKER_JS}
+    const tracker = window.__agentDom;
+    // Дельты движков CDP считаются по снимкам, а не по "грязным" поддеревьям - не копим их
+    tracker.dirty.clear();
+    tracker.baseline = true;
+    tracker.baselineScroll = Math.round(window.scrollY);
+    const pageHeight = document.documentElement.scrollHeight;
+    return {{
+        url: location.href,
+        title: document.title,
+        version: tracker.version,
+        scroll: tracker.baselineScroll,
+        window: {{start: 0, end: pageHeight, page_height: pageHeight}}
+    }};
+}}
+"""
+
+_CONTAINS_TEXT_JS = """
+(needle) => ((document.body || document.documentElement).innerText || '').toLowerCase().includes(needle)
+"""
+
+
+def create_snapshot_engine(name: str, page: Page):
+    """Движок снимков по имени из SNAPSHOT_CONFIG["engine"]; None - скрипт страницы"""
+    if name == "js":
+        return None
+    if name == "ax":
+        return AXSnapshotEngine(page)
+    if name == "domsnapshot":
+        return DOMSnapshotEngine(page)
+    raise ValueError(f"Неизвестный движок снимков: {name}")
+
+
+async def launch_browser(playwright) -> Browser:
+    """Запустить процесс Chromium с настройками из Config.BROWSER_CONFIG"""
+    return await playwright.chromium.launch(
+        headless=Config.BROWSER_CONFIG["headless"],
+        args=Config.BROWSER_CONFIG["args"]
+    )
+
+
+async def prepare_context(context: BrowserContext, blocker: Optional[ResourceBlocker] = None):
+    """Подготовить новый контекст браузера к работе агента"""
+    await context.add_init_script(script=_DOM_TRACKER_JS)
+    if blocker is not None:
+        await blocker.install(context)
+
 
 class BrowserController:
     """Контроллер для управления браузером через Playwright"""
@@ -16,38 +411,103 @@ class BrowserController:
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.playwright = None
+        self.settle_engine: Optional[SettleEngine] = None
+        self.resource_blocker: Optional[ResourceBlocker] = None
+        self._owns_context = False
+        self._tracked_url: Optional[str] = None
+        self._tracked_title = ""
+        self._tracked_elements: List[Dict[str, Any]] = []
+        self._tracked_text = ""
+        self._snapshot_cache: Optional[Dict[str, Any]] = None
+        self._read_cursor = 0
+        self.snapshot_engine = None
+        self.cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "prefetches": 0}
+        self.settle_stats = {"count": 0, "total_seconds": 0.0}
 
     async def launch(self):
         """Запустить браузер"""
         self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=False)
-        self.context = await self.browser.new_context()
-        self.page = await self.context.new_page()
+        self.browser = await launch_browser(self.playwright)
+        context = await self.browser.new_context()
+        self.resource_blocker = ResourceBlocker(Config.NETWORK_CONFIG["block_profile"])
+        await prepare_context(context, self.resource_blocker)
+        await self.attach(context, owns_context=True)
         logger.info("Браузер запущен")
 
+    async def attach(self, context: BrowserContext, owns_context: bool = False):
+        """Открыть рабочую страницу в готовом контексте (например, из BrowserPool)"""
+        self.context = context
+        self._owns_context = owns_context
+        self.page = await context.new_page()
+        self.page.on("framenavigated", self._on_frame_navigated)
+        self.settle_engine = SettleEngine(
+            self.page,
+            dom_quiet_ms=Config.SETTLE_CONFIG["dom_quiet_ms"],
+            network_quiet_ms=Config.SETTLE_CONFIG["network_quiet_ms"],
+            timeout=Config.SETTLE_CONFIG["timeout"]
+        )
+        self.snapshot_engine = create_snapshot_engine(Config.SNAPSHOT_CONFIG["engine"], self.page)
+
     async def close(self):
-        """Закрыть браузер"""
+        """Закрыть браузер
+
+        Контекст, полученный через attach без владения, остается открытым.
+        """
         if self.page:
             await self.page.close()
-        if self.context:
+            self.page = None
+        if self.context and self._owns_context:
             await self.context.close()
+        self.context = None
         if self.browser:
             await self.browser.close()
+            self.browser = None
+            logger.info("Браузер закрыт")
         if self.playwright:
             await self.playwright.stop()
-        logger.info("Браузер закрыт")
+            self.playwright = None
 
     async def navigate(self, url: str):
         """Перейти на URL"""
         await self.page.goto(url, wait_until="domcontentloaded")
         logger.info(f"Переход на {url}")
+        await self.settle(Config.SETTLE_CONFIG["navigation_timeout"])
+
+    async def resolve_selector(self, selector: str) -> str:
+        """Преобразовать handle элемента вида @12 в селектор Playwright"""
+        match = _HANDLE_RE.match(selector.strip())
+        if not match:
+            return selector
+        if self.snapshot_engine is None:
+            return f'[data-agent-handle="{match.group(1)}"]'
+        # Движки CDP не размечают страницу при снимке, элемент помечается перед действием
+        return await self.snapshot_engine.locate(int(match.group(1)))
+
+    def tracked_element(self, selector: str) -> Optional[Dict[str, Any]]:
+        """Элемент последнего снимка, на который ссылается handle вида @12"""
+        match = _HANDLE_RE.match(selector.strip())
+        if match:
+            handle = int(match.group(1))
+            for elem in self._tracked_elements:
+                if elem.get("handle") == handle:
+                    return elem
+        return None
+
+    def stable_selector(self, selector: str) -> str:
+        """Уникальный CSS селектор вместо handle
+
+        Handle действителен только на текущей странице, поэтому для записи
+        действий он заменяется селектором; прочие селекторы не меняются.
+        """
+        elem = self.tracked_element(selector)
+        return elem["selector"] if elem else selector
 
     async def click(self, selector: str):
         """Клик по элементу"""
         try:
-            await self.page.click(selector)
+            await self.page.click(await self.resolve_selector(selector))
             logger.info(f"Клик: {selector}")
-            await asyncio.sleep(0.5)
+            await self.settle()
         except Exception as e:
             logger.error(f"Ошибка клика: {e}")
             raise
@@ -55,9 +515,9 @@ class BrowserController:
     async def type_text(self, selector: str, text: str):
         """Ввод текста в поле"""
         try:
-            await self.page.fill(selector, text)
+            await self.page.fill(await self.resolve_selector(selector), text)
             logger.info(f"Ввод в {selector}: {text}")
-            await asyncio.sleep(0.3)
+            await self.settle()
         except Exception as e:
             logger.error(f"Ошибка ввода: {e}")
             raise
@@ -69,7 +529,16 @@ class BrowserController:
         """
         await self.page.evaluate(script)
         logger.info(f"Прокрутка {direction}")
-        await asyncio.sleep(0.5)
+        await self.settle()
+
+    async def settle(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться стабилизации страницы (сеть и DOM), но не дольше timeout"""
+        started = time.monotonic()
+        try:
+            return await self.settle_engine.settle(timeout)
+        finally:
+            self.settle_stats["count"] += 1
+            self.settle_stats["total_seconds"] += time.monotonic() - started
 
     async def get_page_content(self) -> str:
         """Получить HTML содержимое страницы"""
@@ -77,75 +546,193 @@ class BrowserController:
         return content
 
     async def extract_text_content(self) -> str:
-        """Извлечь текстовое содержимое страницы"""
-        text = await self.page.evaluate("""
-        () => {
-            const walker = document.createTreeWalker(
-                document.body,
-                NodeFilter.SHOW_TEXT,
-                null,
-                false
-            );
-            let text = '';
-            let node;
-            while (node = walker.nextNode()) {
-                const trimmed = node.textContent.trim();
-                if (trimmed && trimmed.length > 0) {
-                    text += trimmed + '\\n';
-                }
-            }
-            return text;
-        }
-        """)
-        return text
+        """Извлечь текст в окне просмотра с запасом EXTRACTION_CONFIG["viewport_margin"]
+
+        Базовый снимок для snapshot_delta не меняется.
+        """
+        if self.snapshot_engine is not None:
+            return (await self._capture())["text"]
+        return await self.page.evaluate(
+            f"(margin) => {{ {_PAGE_HELPERS_JS} return collectText(undefined, viewportBand(margin)); }}",
+            Config.EXTRACTION_CONFIG["viewport_margin"]
+        )
+
+    async def read_text(self, cursor: Optional[int] = None) -> Dict[str, Any]:
+        """Прочитать следующую порцию текста страницы, начиная с cursor (px от начала документа)
+
+        Без cursor чтение продолжается с конца предыдущей порции или
+        окна последнего снимка. Страница при этом не прокручивается.
+        """
+        start = self._read_cursor if cursor is None else max(0, int(cursor))
+        portion = await self.page.evaluate(_READ_TEXT_JS, [start, Config.EXTRACTION_CONFIG["viewport_margin"]])
+        self._read_cursor = portion["end"]
+        return portion
+
+    async def contains_text(self, text: str) -> bool:
+        """Проверить, есть ли текст где-либо на странице (а не только в окне просмотра)"""
+        return await self.page.evaluate(_CONTAINS_TEXT_JS, text.lower())
 
     async def get_interactive_elements(self) -> List[Dict[str, Any]]:
-        """Получить список интерактивных элементов на странице"""
-        elements = await self.page.evaluate("""
-        () => {
-            const selectors = [];
-            const elements = document.querySelectorAll('button, a, input, select, textarea, [role="button"]');
-            
-            elements.forEach((el, idx) => {
-                const rect = el.getBoundingClientRect();
-                if (rect.width > 0 && rect.height > 0) {
-                    let selector = '';
-                    if (el.id) {
-                        selector = `#${el.id}`;
-                    } else if (el.className) {
-                        selector = `.${el.className.split(' ')[0]}`;
-                    } else {
-                        selector = el.tagName.toLowerCase();
-                    }
-                    
-                    const text = el.textContent.trim().substring(0, 50);
-                    const type = el.getAttribute('type') || el.tagName.toLowerCase();
-                    const placeholder = el.getAttribute('placeholder') || '';
-                    
-                    selectors.push({
-                        selector: selector,
-                        text: text,
-                        type: type,
-                        placeholder: placeholder,
-                        visible: rect.top < window.innerHeight && rect.bottom > 0
-                    });
-                }
-            });
-            
-            return selectors.slice(0, 50);
-        }
-        """)
-        return elements
+        """Получить список интерактивных элементов на странице
+
+        Базовый снимок для snapshot_delta не меняется.
+        """
+        if self.snapshot_engine is not None:
+            return (await self._capture())["elements"]
+        return await self.page.evaluate(f"() => {{ {_PAGE_HELPERS_JS} return collectElements(); }}")
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Получить URL, заголовок, текст и элементы страницы за один вызов
+
+        Текст берется только из окна просмотра с запасом (поле window
+        описывает полосу документа), остальное читается через read_text.
+        Результат кэшируется по URL, версии DOM и прокрутке: пока страница
+        не изменилась, повторный вызов не запускает извлечение заново.
+        """
+        snapshot = await self._capture()
+        self._tracked_url = snapshot["url"]
+        self._tracked_title = snapshot["title"]
+        self._tracked_elements = snapshot["elements"]
+        self._tracked_text = snapshot["text"]
+        return snapshot
+
+    async def prefetch(self) -> Optional[Dict[str, Any]]:
+        """Заранее снять страницу в кэш снимков, пока агент занят другим
+
+        Базовый снимок для snapshot_delta не меняется. Скрипт страницы при
+        снимке сбрасывает отслеживание изменений DOM, поэтому без движка CDP
+        заранее снимается только новая страница: дельта для нее все равно
+        будет полным снимком.
+        """
+        if self.snapshot_engine is None and self.page.url == self._tracked_url:
+            return None
+        self.cache_stats["prefetches"] += 1
+        return await self._capture()
+
+    async def _capture(self) -> Dict[str, Any]:
+        if self._snapshot_cache is not None:
+            version = await self.page.evaluate(_DOM_VERSION_JS)
+            cached = self._snapshot_cache
+            if version == [cached["version"], cached["scroll"]] and self.page.url == cached["url"]:
+                self.cache_stats["hits"] += 1
+                return cached
+
+        self.cache_stats["misses"] += 1
+        if self.snapshot_engine is not None:
+            # Версия читается до снимка: изменения во время захвата вызовут повторный снимок
+            info = await self.page.evaluate(_PAGE_INFO_JS)
+            snapshot = dict(info, **await self.snapshot_engine.capture())
+        else:
+            snapshot = await self.page.evaluate(_SNAPSHOT_JS, Config.EXTRACTION_CONFIG["viewport_margin"])
+        self._snapshot_cache = snapshot
+        self._read_cursor = snapshot["window"]["end"]
+        return snapshot
+
+    async def snapshot_delta(self) -> Dict[str, Any]:
+        """Получить изменения страницы с момента последнего снимка
+
+        Если базового снимка нет, произошла навигация или изменилась
+        большая часть страницы, возвращается полный снимок с full=True.
+        """
+        if self.snapshot_engine is not None:
+            return await self._engine_delta()
+
+        delta = None
+        if self._tracked_url is not None:
+            delta = await self.page.evaluate(_DELTA_JS, Config.EXTRACTION_CONFIG["viewport_margin"])
+
+        if delta is None or delta["url"] != self._tracked_url:
+            snapshot = await self.snapshot()
+            return dict(snapshot, full=True)
+
+        if delta.get("unchanged"):
+            self.cache_stats["hits"] += 1
+            return {
+                "url": self._tracked_url,
+                "title": self._tracked_title,
+                "version": delta["version"],
+                "text": "",
+                "added": [],
+                "updated": [],
+                "removed": [],
+                "full": False,
+                "elements": self._tracked_elements
+            }
+
+        self.cache_stats["misses"] += 1
+        self._snapshot_cache = None
+        removed_handles = set(delta["removed"])
+        updated = {elem["handle"]: elem for elem in delta["updated"]}
+        removed = [elem for elem in self._tracked_elements if elem.get("handle") in removed_handles]
+        self._tracked_title = delta["title"]
+        self._tracked_elements = [
+            updated.get(elem.get("handle"), elem)
+            for elem in self._tracked_elements
+            if elem.get("handle") not in removed_handles
+        ] + delta["added"]
+
+        return dict(delta, full=False, removed=removed, elements=self._tracked_elements)
+
+    async def _engine_delta(self) -> Dict[str, Any]:
+        """Дельта для движков CDP: сравнение нового снимка с предыдущим по handle"""
+        previous_url = self._tracked_url
+        previous = {elem["handle"]: elem for elem in self._tracked_elements}
+        previous_lines = set(self._tracked_text.splitlines())
+        snapshot = await self.snapshot()
+        if previous_url is None or snapshot["url"] != previous_url:
+            return dict(snapshot, full=True)
+
+        current = {elem["handle"]: elem for elem in snapshot["elements"]}
+        return dict(
+            snapshot,
+            full=False,
+            text="\n".join(line for line in snapshot["text"].splitlines() if line not in previous_lines),
+            added=[elem for handle, elem in current.items() if handle not in previous],
+            updated=[elem for handle, elem in current.items() if handle in previous and previous[handle] != elem],
+            removed=[elem for handle, elem in previous.items() if handle not in current]
+        )
+
+    def reset_tracking(self):
+        """Сбросить базовый снимок: следующий snapshot_delta вернет полную страницу"""
+        self._tracked_url = None
+        self._tracked_title = ""
+        self._tracked_elements = []
+        self._tracked_text = ""
+
+    def invalidate_cache(self):
+        """Сбросить кэш снимков страницы"""
+        if self._snapshot_cache is not None:
+            self.cache_stats["invalidations"] += 1
+        self._snapshot_cache = None
+
+    def _on_frame_navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.invalidate_cache()
+            self._read_cursor = 0
 
     async def wait_for_element(self, selector: str, timeout: int = 5000):
         """Ожидать появления элемента"""
         try:
-            await self.page.wait_for_selector(selector, timeout=timeout)
+            await self.page.wait_for_selector(await self.resolve_selector(selector), timeout=timeout)
             logger.info(f"Элемент появился: {selector}")
         except Exception as e:
             logger.error(f"Ошибка ожидания элемента: {e}")
             raise
 
+    async def element_exists(self, selector: str, timeout: int = 2000) -> bool:
+        """Проверить наличие элемента, подождав не дольше timeout мс
+
+        timeout=0 - проверка без ожидания (в Playwright 0 означает ожидание без ограничения).
+        """
+        try:
+            resolved = await self.resolve_selector(selector)
+            if timeout <= 0:
+                return await self.page.query_selector(resolved) is not None
+            await self.page.wait_for_selector(resolved, timeout=timeout, state="attached")
+            return True
+        except Exception:
+            return False
+
     async def get_current_url(self) -> str:
         """Получить текущий URL"""
         return self.page.url
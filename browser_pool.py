@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext
+from browser_controller import BrowserController, launch_browser, prepare_context
+from config import Config
+from resource_blocker import ResourceBlocker
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledContext:
+    """Контекст браузера, выданный задаче, и процесс, которому он принадлежит"""
+
+    def __init__(self, browser: Browser, context: BrowserContext):
+        self.browser = browser
+        self.context = context
+
+
+class BrowserPool:
+    """Пул прогретых процессов Chromium, выдающий агентам изолированные контексты
+
+    Прогреваются процессы браузера; контекст создается для каждой задачи
+    и закрывается после нее. Очистка cookies не убирает localStorage,
+    IndexedDB, HTTP кэш и service worker'ы, поэтому повторное
+    использование контекста сделало бы результаты зависимыми от порядка задач.
+    """
+
+    def __init__(self, browsers: Optional[int] = None, max_concurrency: Optional[int] = None):
+        self.browsers_count = browsers or Config.POOL_CONFIG["browsers"]
+        self.max_concurrency = max_concurrency or Config.POOL_CONFIG["max_concurrency"]
+        self.playwright = None
+        self.browsers: List[Browser] = []
+        self._active_per_browser: Dict[Browser, int] = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._lock = asyncio.Lock()
+        self.resource_blocker = ResourceBlocker(Config.NETWORK_CONFIG["block_profile"])
+        self.stats = {
+            "leases": 0,
+            "active": 0,
+            "peak_active": 0,
+            "waiting": 0,
+            "total_wait_seconds": 0.0,
+            "contexts_created": 0,
+            "browsers_launched": 0
+        }
+
+    async def start(self):
+        """Запустить процессы браузера"""
+        self.playwright = await async_playwright().start()
+        for _ in range(self.browsers_count):
+            await self._launch_browser()
+        logger.info(f"Пул браузеров запущен: {self.browsers_count} процесс(ов), "
+                    f"до {self.max_concurrency} задач одновременно")
+
+    async def close(self):
+        """Закрыть процессы браузера"""
+        for browser in self.browsers:
+            if browser.is_connected():
+                await browser.close()
+        self.browsers = []
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+        logger.info("Пул браузеров закрыт")
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[BrowserController]:
+        """Арендовать контроллер с отдельной страницей в изолированном контексте"""
+        started = time.monotonic()
+        self.stats["waiting"] += 1
+        async with self._semaphore:
+            self.stats["waiting"] -= 1
+            self.stats["total_wait_seconds"] += time.monotonic() - started
+            pooled = await self._acquire()
+            self.stats["leases"] += 1
+            self.stats["active"] += 1
+            self.stats["peak_active"] = max(self.stats["peak_active"], self.stats["active"])
+
+            controller = BrowserController()
+            try:
+                await controller.attach(pooled.context)
+                yield controller
+            finally:
+                await controller.close()
+                self.stats["active"] -= 1
+                await self._release(pooled)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить статистику пула"""
+        stats = dict(self.stats)
+        stats["browsers"] = len(self.browsers)
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / stats["leases"] if stats["leases"] else 0.0
+        stats["network"] = self.resource_blocker.get_stats()
+        return stats
+
+    async def _launch_browser(self) -> Browser:
+        browser = await launch_browser(self.playwright)
+        self.browsers.append(browser)
+        self._active_per_browser[browser] = 0
+        self.stats["browsers_launched"] += 1
+        return browser
+
+    async def _acquire(self) -> _PooledContext:
+        async with self._lock:
+            browser = await self._pick_browser()
+            context = await browser.new_context()
+            await prepare_context(context, self.resource_blocker)
+            self.stats["contexts_created"] += 1
+            self._active_per_browser[browser] += 1
+            return _PooledContext(browser, context)
+
+    async def _pick_browser(self) -> Browser:
+        """Выбрать наименее загруженный живой процесс, перезапустив упавшие"""
+        for browser in list(self.browsers):
+            if not browser.is_connected():
+                logger.warning("Процесс браузера упал, перезапуск")
+                self.browsers.remove(browser)
+                self._active_per_browser.pop(browser, None)
+                await self._launch_browser()
+        return min(self.browsers, key=lambda b: self._active_per_browser[b])
+
+    async def _release(self, pooled: _PooledContext):
+        async with self._lock:
+            if pooled.browser in self._active_per_browser:
+                self._active_per_browser[pooled.browser] -= 1
+        await self._close_context(pooled)
+
+    async def _close_context(self, pooled: _PooledContext):
+        try:
+            await pooled.context.close()
+        except Exception as e:
+            logger.warning(f"Ошибка закрытия контекста: {e}")
@@ -0,0 +1,44 @@
+import abc
+from typing import Any, Dict, Optional, Tuple
+from playwright.async_api import CDPSession, Page
+
+
+class CDPSnapshotEngine(abc.ABC):
+    """Основа движков снимков через сессию CDP страницы
+
+    Подклассы реализуют capture(), возвращающий text и elements (и при
+    необходимости window); handle элементов - backendDOMNodeId.
+    """
+
+    # Домены CDP, включаемые при открытии сессии
+    domains: Tuple[str, ...] = ()
+
+    def __init__(self, page: Page):
+        self.page = page
+        self._session: Optional[CDPSession] = None
+
+    async def _cdp(self) -> CDPSession:
+        if self._session is None:
+            self._session = await self.page.context.new_cdp_session(self.page)
+            for domain in self.domains:
+                await self._session.send(f"{domain}.enable")
+        return self._session
+
+    async def locate(self, handle: int) -> str:
+        """Пометить элемент по backendDOMNodeId атрибутом и вернуть селектор для Playwright"""
+        cdp = await self._cdp()
+        resolved = await cdp.send("DOM.resolveNode", {"backendNodeId": handle})
+        object_id = resolved["object"]["objectId"]
+        try:
+            await cdp.send("Runtime.callFunctionOn", {
+                "objectId": object_id,
+                "functionDeclaration": "function(handle) { this.setAttribute('data-agent-handle', handle); }",
+                "arguments": [{"value": str(handle)}]
+            })
+        finally:
+            await cdp.send("Runtime.releaseObject", {"objectId": object_id})
+        return f'[data-agent-handle="{handle}"]'
+
+    @abc.abstractmethod
+    async def capture(self) -> Dict[str, Any]:
+        """Снять страницу: text, elements и при необходимости window"""
@@ -10,16 +10,84 @@ class Config:
     
     # Конфигурация браузера
     BROWSER_CONFIG = {
-        "headless": False,
+        "headless": os.getenv("BROWSER_HEADLESS", "false").lower() == "true",
         "args": ["--no-sandbox", "--disable-setuid-sandbox"]
     }
     
+    # Блокировка тяжелых ресурсов и трекеров: "none", "light" или "aggressive"
+    NETWORK_CONFIG = {
+        "block_profile": os.getenv("BROWSER_BLOCK_PROFILE", "none")
+    }
+    
     # Конфигурация агента
     AGENT_CONFIG = {
         "max_iterations": 20,
         "max_retries": 3,
         "timeout": 30000,
-        "wait_between_actions": 0.3
+        "wait_between_actions": 0.3,
+        "plan_mode": True,
+        # Снимать страницу сразу после действия, параллельно с остальной работой итерации
+        "prefetch": True
+    }
+    
+    # Пул браузеров для параллельного выполнения задач
+    POOL_CONFIG = {
+        "browsers": 1,
+        "max_concurrency": 4
+    }
+    
+    # Ожидание стабилизации страницы после действий
+    SETTLE_CONFIG = {
+        "dom_quiet_ms": 200,
+        "network_quiet_ms": 300,
+        "timeout": 5.0,
+        "navigation_timeout": 10.0
+    }
+    
+    # Движок снимков страницы: "js" (скрипт страницы), "ax" (дерево доступности через CDP)
+    # или "domsnapshot" (DOMSnapshot.captureSnapshot через CDP)
+    SNAPSHOT_CONFIG = {
+        "engine": os.getenv("SNAPSHOT_ENGINE", "js")
+    }
+    
+    # Извлечение текста: окно просмотра плюс запас в высотах окна сверху и снизу,
+    # остальной текст модель дочитывает инструментом read_more
+    EXTRACTION_CONFIG = {
+        "viewport_margin": 1.0
+    }
+    
+    # Конфигурация LLM
+    LLM_CONFIG = {
+        "timeout": 60.0,
+        "max_retries": 2,
+        "streaming": True,
+        "model": os.getenv("LLM_MODEL", "claude-3-5-sonnet-20241022"),
+        "max_tokens": 1500,
+        # Кассета ответов модели: "" (выключена), "record", "replay" или "auto"
+        "cassette_mode": os.getenv("LLM_CASSETTE", ""),
+        "cassette_dir": os.getenv("LLM_CASSETTE_DIR", "cassettes")
+    }
+    
+    # Кэш ответов модели для повторных запусков тех же задач на неизменных страницах
+    RESPONSE_CACHE_CONFIG = {
+        "enabled": os.getenv("LLM_RESPONSE_CACHE", "false").lower() == "true",
+        "path": os.getenv("LLM_RESPONSE_CACHE_PATH", "llm_cache.sqlite"),
+        "ttl_seconds": float(os.getenv("LLM_RESPONSE_CACHE_TTL", "86400")),
+        "max_bytes": 50 * 1024 * 1024
+    }
+    
+    # Запись успешных траекторий и их воспроизведение без модели
+    TRAJECTORY_CONFIG = {
+        "enabled": os.getenv("TRAJECTORY_REPLAY", "false").lower() == "true",
+        "directory": os.getenv("TRAJECTORY_DIR", "trajectories"),
+        # Сохранять введенный текст (кроме паролей); иначе воспроизведение останавливается перед вводом
+        "record_typed_text": os.getenv("TRAJECTORY_RECORD_TEXT", "false").lower() == "true"
+    }
+    
+    # Экспорт метрик задач: JSONL по строке на задачу и textfile для Prometheus node_exporter
+    METRICS_CONFIG = {
+        "jsonl_path": os.getenv("METRICS_JSONL", ""),
+        "prometheus_path": os.getenv("METRICS_PROMETHEUS", "")
     }
     
     # Конфигурация контекста
@@ -27,7 +95,8 @@ class Config:
         "max_tokens": 8000,
         "token_buffer": 500,
         "max_page_content": 2000,
-        "max_elements": 15
+        "max_elements": 15,
+        "keep_observations": 2
     }
     
     # Деструктивные действия, требующие подтверждения
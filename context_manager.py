@@ -1,46 +1,103 @@
 import logging
-from typing import Dict, List, Any
+import re
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 import json
+from element_ranker import ElementRanker
 
 logger = logging.getLogger(__name__)
 
+# Разбиение текста на участки одной письменности для оценки токенов
+_TOKEN_RUN_RE = re.compile(
+    r"(?P<latin>[A-Za-z]+)"
+    r"|(?P<cyrillic>[\u0400-\u04FF]+)"
+    r"|(?P<digits>[0-9]+)"
+    r"|(?P<cjk>[\u3040-\u30FF\u3400-\u9FFF\uAC00-\uD7AF]+)"
+    r"|(?P<word>\w+)"
+    r"|(?P<symbols>[^\s\w]+)"
+    r"|(?P<newlines>\n+)"
+)
+
+# Средняя длина токена в символах для каждой письменности, откалиброванная
+# по токенизатору Claude; любой непустой участок стоит минимум один токен
+_CHARS_PER_TOKEN = {
+    "latin": 4.2,
+    "cyrillic": 2.6,
+    "digits": 3.0,
+    "cjk": 1.0,
+    "word": 2.0,
+    "symbols": 1.6,
+    "newlines": 1000.0
+}
+
+
+@lru_cache(maxsize=2048)
+def _estimate_text_tokens(text: str) -> int:
+    total = 0.0
+    for match in _TOKEN_RUN_RE.finditer(text):
+        length = match.end() - match.start()
+        total += max(1.0, length / _CHARS_PER_TOKEN[match.lastgroup])
+    return int(total) + 1
+
+
+# Бюджет предпросмотра текста в резюме страницы
+PAGE_PREVIEW_TOKENS = 1500
+
+
+# Результат кэшируется: текст, сжатый заранее (при упреждающем снимке страницы),
+# при построении резюме берется готовым
+@lru_cache(maxsize=64)
+def _compress_text(content: str, max_tokens: int) -> str:
+    estimated = _estimate_text_tokens(content)
+    
+    if estimated <= max_tokens:
+        return content
+    
+    lines = content.split('\n')
+    compressed = []
+    
+    for line in lines:
+        stripped = line.strip()
+        if stripped and len(stripped) > 3:
+            if not any(keyword in stripped.lower() for keyword in ['script', 'style', 'meta', 'link']):
+                compressed.append(stripped)
+    
+    result = '\n'.join(compressed)
+    
+    estimated = _estimate_text_tokens(result)
+    if estimated > max_tokens:
+        result = result[:int(len(result) * max_tokens / estimated * 0.95)]
+    
+    return result
+
 
 class ContextManager:
     """Менеджер контекста для оптимизации работы с ограничениями по токенам"""
     
-    def __init__(self, max_tokens: int = 8000):
+    def __init__(self, max_tokens: int = 8000, token_buffer: int = 500):
         self.max_tokens = max_tokens
-        self.token_buffer = 500
+        self.token_buffer = token_buffer
         self.available_tokens = max_tokens - self.token_buffer
+        self.element_ranker = ElementRanker()
+        self.focus_text = ""
+
+    def set_focus(self, text: str):
+        """Задать текст задачи и последних рассуждений для ранжирования элементов"""
+        self.focus_text = text
+
+    def select_elements(self, elements: List[Dict[str, Any]], max_items: int) -> List[Dict[str, Any]]:
+        """Выбрать max_items наиболее полезных для задачи элементов"""
+        if not self.focus_text:
+            return elements[:max_items]
+        return self.element_ranker.rank(elements, self.focus_text, max_items)
 
     def estimate_tokens(self, text: str) -> int:
-        """Оценить количество токенов в тексте"""
-        return len(text.split()) // 4 + 1
+        """Оценить количество токенов в тексте с учетом письменности"""
+        return _estimate_text_tokens(text)
 
     def compress_page_content(self, content: str, max_tokens: int = 2000) -> str:
         """Сжать содержимое страницы для оптимизации контекста"""
-        estimated = self.estimate_tokens(content)
-        
-        if estimated <= max_tokens:
-            return content
-        
-        lines = content.split('\n')
-        compressed = []
-        
-        for line in lines:
-            stripped = line.strip()
-            if stripped and len(stripped) > 3:
-                if not any(keyword in stripped.lower() for keyword in ['script', 'style', 'meta', 'link']):
-                    compressed.append(stripped)
-        
-        result = '\n'.join(compressed)
-        
-        if self.estimate_tokens(result) > max_tokens:
-            words = result.split()
-            words = words[:max_tokens * 4]
-            result = ' '.join(words)
-        
-        return result
+        return _compress_text(content, max_tokens)
 
     def format_elements_for_context(self, elements: List[Dict[str, Any]], max_items: int = 15) -> str:
         """Форматировать элементы для контекста"""
@@ -48,35 +105,266 @@ class ContextManager:
             return "Интерактивные элементы не найдены"
         
         formatted = []
-        for i, elem in enumerate(elements[:max_items]):
+        for i, elem in enumerate(self.select_elements(elements, max_items)):
             text = elem.get('text', '')[:40]
             selector = elem.get('selector', '')
-            elem_type = elem.get('type', '')
+            elem_type = elem.get('role') or elem.get('type', '')
+            label = f"@{elem['handle']}" if 'handle' in elem else str(i)
+            # Состояние (disabled, checked, expanded...) приходит из дерева доступности
+            state = f" [{elem['state']}]" if elem.get('state') else ""
             
-            formatted.append(f"[{i}] {selector} ({elem_type}) - {text}")
+            formatted.append(f"[{label}] {selector} ({elem_type}){state} - {text}")
         
         return '\n'.join(formatted)
 
-    def create_page_summary(self, url: str, content: str, elements: List[Dict[str, Any]]) -> str:
-        """Создать резюме страницы"""
+    def create_page_summary(self, url: str, content: str, elements: List[Dict[str, Any]],
+                            title: str = "", delta: Optional[Dict[str, Any]] = None) -> str:
+        """Создать резюме страницы
+
+        Если передан неполный delta от BrowserController.snapshot_delta,
+        вместо всей страницы описываются только изменения.
+        """
+        if delta is not None and not delta.get("full", True):
+            return self.create_delta_summary(url, title, delta)
+
+        window_note = self.describe_text_window(delta.get("window")) if delta else ""
         summary = f"""Текущая страница:
 URL: {url}
+Заголовок: {title}
 
 Предпросмотр содержимого:
-{self.compress_page_content(content, 1500)}
+{self.compress_page_content(content, PAGE_PREVIEW_TOKENS)}{window_note}
 
 Интерактивные элементы:
 {self.format_elements_for_context(elements, 12)}"""
         
         return summary
 
-    def estimate_conversation_tokens(self, messages: List[Dict[str, str]]) -> int:
+    def describe_text_window(self, window: Optional[Dict[str, Any]]) -> str:
+        """Пометка о том, что текст взят только из части страницы"""
+        if not window or window["end"] >= window["page_height"]:
+            return ""
+        return (f"\n(Показан текст {window['start']}-{window['end']} px из {window['page_height']} px, "
+                f"остальное доступно через read_more)")
+
+    def format_text_portion(self, portion: Dict[str, Any], max_tokens: int = 2000) -> str:
+        """Форматировать порцию текста из BrowserController.read_text"""
+        text = self.compress_page_content(portion["text"], max_tokens) or "(no text in this part of the page)"
+        if portion["end"] < portion["page_height"]:
+            footer = f"Next cursor: {portion['end']} (page height {portion['page_height']} px)"
+        else:
+            footer = "End of page."
+        return f"Text {portion['start']}-{min(portion['end'], portion['page_height'])} px:\n{text}\n\n{footer}"
+
+    def create_delta_summary(self, url: str, title: str, delta: Dict[str, Any]) -> str:
+        """Создать резюме изменений страницы с прошлого снимка"""
+        if not (delta["text"] or delta["added"] or delta["updated"] or delta["removed"]):
+            return f"""Текущая страница (без изменений с прошлого снимка):
+URL: {url}
+Заголовок: {title}"""
+
+        sections = [f"""Изменения на странице с прошлого снимка:
+URL: {url}
+Заголовок: {title}"""]
+        if delta["text"]:
+            sections.append(f"Измененный текст:\n{self.compress_page_content(delta['text'], 800)}")
+        if delta["added"]:
+            sections.append(f"Новые элементы:\n{self.format_elements_for_context(delta['added'], 12)}")
+        if delta["updated"]:
+            sections.append(f"Измененные элементы:\n{self.format_elements_for_context(delta['updated'], 8)}")
+        if delta["removed"]:
+            sections.append(f"Исчезнувшие элементы:\n{self.format_elements_for_context(delta['removed'], 8)}")
+
+        return '\n\n'.join(sections)
+
+    def estimate_message_tokens(self, message: Dict[str, Any]) -> int:
+        """Оценить количество токенов в сообщении (строка или список блоков)"""
+        content = message.get('content', '')
+        if isinstance(content, str):
+            return self.estimate_tokens(content)
+        
+        total = 0
+        for block in content:
+            if block.get('type') == 'text':
+                total += self.estimate_tokens(block['text'])
+            elif block.get('type') == 'tool_use':
+                total += self.estimate_tokens(json.dumps(block.get('input', {}), ensure_ascii=False))
+            elif block.get('type') == 'tool_result':
+                total += self.estimate_message_tokens(block)
+        return total
+
+    def estimate_conversation_tokens(self, messages: List[Dict[str, Any]]) -> int:
         """Оценить количество токенов в диалоге"""
         total = 0
         for msg in messages:
-            total += self.estimate_tokens(msg.get('content', ''))
+            total += self.estimate_message_tokens(msg)
         return total
 
-    def should_trim_history(self, messages: List[Dict[str, str]]) -> bool:
+    def should_trim_history(self, messages: List[Dict[str, Any]]) -> bool:
         """Проверить, нужно ли обрезать историю"""
         return self.estimate_conversation_tokens(messages) > self.available_tokens * 0.8
+
+    def create_observation(self, message: Dict[str, Any], url: str, title: str = "") -> Dict[str, Any]:
+        """Создать запись о наблюдении страницы для последующего сжатия истории"""
+        return {
+            "message": message,
+            "url": url,
+            "title": title,
+            "actions": [],
+            "outcomes": [],
+            "compacted": False
+        }
+
+    def summarize_observation(self, observation: Dict[str, Any]) -> str:
+        """Краткая сводка наблюдения: URL, выполненные действия и их результат"""
+        actions = ', '.join(observation["actions"]) or 'нет'
+        outcomes = '; '.join(outcome[:80] for outcome in observation["outcomes"]) or 'нет'
+        title = f" ({observation['title']})" if observation["title"] else ""
+        return f"[Сжатое наблюдение] URL: {observation['url']}{title}\nДействия: {actions}\nРезультат: {outcomes}"
+
+    def compact_history(self, observations: List[Dict[str, Any]], keep_last: int = 2) -> int:
+        """Заменить старые наблюдения страницы краткими сводками
+
+        Последние keep_last наблюдений остаются без изменений. Сообщения
+        изменяются на месте, поэтому история агента обновляется сразу.
+        Возвращает количество сжатых наблюдений.
+        """
+        candidates = observations[:-keep_last] if keep_last > 0 else observations
+        compacted = 0
+        for observation in candidates:
+            if observation["compacted"]:
+                continue
+            self._replace_message_text(observation["message"], self.summarize_observation(observation))
+            observation["compacted"] = True
+            compacted += 1
+        
+        if compacted:
+            logger.info(f"История сжата: наблюдений заменено сводками: {compacted}")
+        return compacted
+
+    def _replace_message_text(self, message: Dict[str, Any], text: str):
+        content = message.get('content', '')
+        if isinstance(content, str):
+            message['content'] = text
+            return
+        
+        replaced = []
+        text_written = False
+        for block in content:
+            if block.get('type') == 'text':
+                if not text_written:
+                    replaced.append(dict(block, text=text))
+                    text_written = True
+            elif block.get('type') == 'tool_result' and isinstance(block.get('content'), str):
+                replaced.append(dict(block, content=self._shorten(block['content'], 150)))
+            else:
+                replaced.append(block)
+        message['content'] = replaced
+
+    def _shorten(self, text: str, max_chars: int) -> str:
+        return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+    def build_cached_request(self, system_prompt: str,
+                             messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Разметить стабильный префикс запроса для кэширования промпта
+
+        Точки кэширования ставятся на системный промпт и на последнее
+        сообщение перед новым наблюдением. История агента не изменяется.
+        """
+        system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        messages = list(messages)
+        if len(messages) >= 2:
+            messages[-2] = self._with_cache_breakpoint(messages[-2])
+        return system, messages
+
+    def _with_cache_breakpoint(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        content = message.get('content', '')
+        if isinstance(content, str):
+            blocks = [{"type": "text", "text": content}]
+        else:
+            blocks = list(content)
+        if not blocks:
+            return message
+        blocks[-1] = dict(blocks[-1], cache_control={"type": "ephemeral"})
+        return dict(message, content=blocks)
+
+    def enforce_budget(self, system_prompt: str, messages: List[Dict[str, Any]],
+                       tools: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Уложить запрос в бюджет токенов
+
+        Сначала отбрасываются самые старые сообщения, затем, если последнее
+        сообщение одно не помещается, сжимается его текст. Схемы инструментов
+        отправляются с каждым запросом и вычитаются из бюджета. Возвращает
+        новую историю и разбивку токенов по разделам запроса.
+        """
+        system_tokens = self.estimate_tokens(system_prompt)
+        tool_tokens = self.estimate_tokens(json.dumps(tools, ensure_ascii=False)) if tools else 0
+        sizes = [self.estimate_message_tokens(msg) for msg in messages]
+        budget = self.available_tokens - system_tokens - tool_tokens
+        
+        start = 0
+        while start < len(messages) - 1 and sum(sizes[start:]) > budget:
+            start += 1
+        # История должна начинаться с сообщения пользователя; остальное уже помещается в бюджет
+        if start < len(messages) - 1 and messages[start].get('role') != 'user':
+            start += 1
+        
+        trimmed = messages[start:]
+        sizes = sizes[start:]
+        if trimmed and not self._is_conversation_start(trimmed[0]):
+            # Вызовы инструментов отброшены - их результаты передаем обычным текстом
+            trimmed[0] = self._tool_results_as_text(trimmed[0])
+            sizes[0] = self.estimate_message_tokens(trimmed[0])
+        if trimmed and sum(sizes) > budget:
+            history_tokens = sum(sizes[:-1])
+            trimmed[-1] = self._shrink_message(trimmed[-1], max(budget - history_tokens, 200))
+            sizes[-1] = self.estimate_message_tokens(trimmed[-1])
+        
+        breakdown = {
+            "system": system_tokens,
+            "tools": tool_tokens,
+            "history": sum(sizes[:-1]),
+            "current": sizes[-1] if sizes else 0,
+            "total": system_tokens + tool_tokens + sum(sizes),
+            "budget": self.available_tokens,
+            "dropped_messages": start
+        }
+        if start:
+            logger.info(f"Бюджет токенов: отброшено старых сообщений: {start}")
+        return trimmed, breakdown
+
+    def _is_conversation_start(self, message: Dict[str, Any]) -> bool:
+        if message.get('role') != 'user':
+            return False
+        content = message.get('content', '')
+        return isinstance(content, str) or not any(block.get('type') == 'tool_result' for block in content)
+
+    def _tool_results_as_text(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        blocks = []
+        for block in message['content']:
+            if block.get('type') == 'tool_result':
+                blocks.append({"type": "text", "text": f"Результат инструмента: {block.get('content', '')}"})
+            else:
+                blocks.append(block)
+        return dict(message, content=blocks)
+
+    def _shrink_message(self, message: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+        content = message.get('content', '')
+        if isinstance(content, str):
+            return dict(message, content=self.compress_page_content(content, max_tokens))
+        
+        text_blocks = [
+            block for block in content
+            if block.get('type') == 'text' or (block.get('type') == 'tool_result' and isinstance(block.get('content'), str))
+        ]
+        if not text_blocks:
+            return message
+        per_block = max(max_tokens // len(text_blocks), 50)
+        shrunk = []
+        for block in content:
+            if block.get('type') == 'text':
+                block = dict(block, text=self.compress_page_content(block['text'], per_block))
+            elif block.get('type') == 'tool_result' and isinstance(block.get('content'), str):
+                block = dict(block, content=self.compress_page_content(block['content'], per_block))
+            shrunk.append(block)
+        return dict(message, content=shrunk)
@@ -0,0 +1,208 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+from ax_snapshot import INTERACTIVE_ROLES
+from cdp_engine import CDPSnapshotEngine
+from config import Config
+
+# Те же элементы, что выбирает INTERACTIVE_SELECTOR скрипта страницы
+INTERACTIVE_TAGS = {"BUTTON", "A", "INPUT", "SELECT", "TEXTAREA"}
+STABLE_ATTRIBUTES = ("data-testid", "data-test", "data-qa", "name", "aria-label", "placeholder")
+MAX_ELEMENTS = 500
+
+_ELEMENT_NODE = 1
+_TEXT_NODE = 3
+_INPUT_ROLES = {"checkbox": "checkbox", "radio": "radio", "submit": "button", "button": "button",
+                "reset": "button", "search": "searchbox"}
+_TAG_ROLES = {"a": "link", "button": "button", "select": "combobox", "textarea": "textbox"}
+
+
+def _css_escape(value: str) -> str:
+    escaped = "".join(ch if ch.isalnum() or ch in "-_" or ord(ch) > 127 else f"\\{ch}" for ch in value)
+    # Идентификатор CSS не может начинаться с цифры
+    if escaped[:1].isdigit():
+        escaped = f"\\3{escaped[0]} {escaped[1:]}"
+    return escaped
+
+
+def _focusable(attrs: Dict[str, str]) -> bool:
+    tabindex = attrs.get("tabindex")
+    return tabindex is not None and tabindex.strip().isdigit()
+
+
+def _role_of(tag: str, attrs: Dict[str, str]) -> str:
+    if attrs.get("role"):
+        return attrs["role"]
+    if tag == "input":
+        return _INPUT_ROLES.get(attrs.get("type", "").lower(), "textbox")
+    return _TAG_ROLES.get(tag, tag)
+
+
+class _Document:
+    """Развернутые колонки NodeTreeSnapshot и LayoutTreeSnapshot одного документа"""
+
+    def __init__(self, document: Dict[str, Any], strings: List[str]):
+        def string(index: int) -> str:
+            return strings[index] if index >= 0 else ""
+
+        nodes = document["nodes"]
+        self.parent = nodes["parentIndex"]
+        self.node_type = nodes["nodeType"]
+        self.name = [string(i) for i in nodes["nodeName"]]
+        self.value = [string(i) for i in nodes["nodeValue"]]
+        self.backend_id = nodes["backendNodeId"]
+        self.attrs = [
+            {string(pairs[i]): string(pairs[i + 1]) for i in range(0, len(pairs), 2)}
+            for pairs in nodes["attributes"]
+        ]
+        input_value = nodes.get("inputValue", {"index": [], "value": []})
+        self.input_value = {i: string(v) for i, v in zip(input_value["index"], input_value["value"])}
+
+        # Индекс среди одноименных соседей для :nth-of-type (узлы идут в порядке документа)
+        self.nth_of_type = [1] * len(self.parent)
+        seen: Dict[Tuple[int, str], int] = {}
+        for index, parent in enumerate(self.parent):
+            if self.node_type[index] == _ELEMENT_NODE:
+                key = (parent, self.name[index])
+                seen[key] = seen.get(key, 0) + 1
+                self.nth_of_type[index] = seen[key]
+
+        layout = document["layout"]
+        self.bounds: Dict[int, List[float]] = {}
+        self.layout_text: Dict[int, str] = {}
+        self.hidden: set = set()
+        for position, node_index in enumerate(layout["nodeIndex"]):
+            self.bounds[node_index] = layout["bounds"][position]
+            styles = layout["styles"][position]
+            if styles and string(styles[0]) == "hidden":
+                self.hidden.add(node_index)
+            text_index = layout["text"][position]
+            if text_index >= 0:
+                self.layout_text[node_index] = strings[text_index]
+
+        self.counts: Dict[str, int] = {}
+        for index, attrs in enumerate(self.attrs):
+            tag = self.name[index].lower()
+            if attrs.get("id"):
+                self._bump(f"#{attrs['id']}")
+            for attr in STABLE_ATTRIBUTES:
+                if attrs.get(attr):
+                    self._bump(f"{tag}[{attr}={attrs[attr]}]")
+
+    def _bump(self, key: str):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def is_rendered(self, index: int) -> bool:
+        rect = self.bounds.get(index)
+        return rect is not None and rect[2] > 0 and rect[3] > 0 and index not in self.hidden
+
+    def unique_selector(self, index: int) -> str:
+        attrs = self.attrs[index]
+        tag = self.name[index].lower()
+        if attrs.get("id") and self.counts.get(f"#{attrs['id']}") == 1:
+            return f"#{_css_escape(attrs['id'])}"
+        for attr in STABLE_ATTRIBUTES:
+            value = attrs.get(attr)
+            if value and self.counts.get(f"{tag}[{attr}={value}]") == 1:
+                return f'{tag}[{attr}="{_css_escape(value)}"]'
+
+        parts = []
+        node = index
+        while node >= 0 and self.name[node] != "HTML":
+            node_id = self.attrs[node].get("id")
+            if node != index and node_id and self.counts.get(f"#{node_id}") == 1:
+                parts.insert(0, f"#{_css_escape(node_id)}")
+                return " > ".join(parts)
+            parts.insert(0, f"{self.name[node].lower()}:nth-of-type({self.nth_of_type[node]})")
+            node = self.parent[node]
+        parts.insert(0, "html")
+        return " > ".join(parts)
+
+
+def decode_dom_snapshot(snapshot: Dict[str, Any], band_top: float, band_bottom: float,
+                        viewport_top: float, viewport_bottom: float) -> Dict[str, Any]:
+    """Декодировать ответ DOMSnapshot.captureSnapshot в text, elements и window
+
+    Координаты bounds - от начала документа. Текст берется из полосы
+    [band_top, band_bottom), видимость элементов - по окну просмотра.
+    Разбирается только основной документ, без iframe.
+    """
+    doc = _Document(snapshot["documents"][0], snapshot["strings"])
+    count = len(doc.parent)
+
+    interactive = [False] * count
+    for index in range(count):
+        if doc.node_type[index] != _ELEMENT_NODE:
+            continue
+        attrs = doc.attrs[index]
+        interactive[index] = (
+            doc.name[index] in INTERACTIVE_TAGS
+            or attrs.get("role") in INTERACTIVE_ROLES
+            or _focusable(attrs)
+        ) and doc.is_rendered(index)
+
+    parts: List[str] = []
+    element_text: Dict[int, List[str]] = {}
+    for index in range(count):
+        if doc.node_type[index] != _TEXT_NODE or not doc.is_rendered(index):
+            continue
+        text = (doc.layout_text.get(index) or doc.value[index]).strip()
+        if not text:
+            continue
+        if band_top <= doc.bounds[index][1] < band_bottom:
+            parts.append(text)
+        # Текст достается всем интерактивным предкам, как textContent
+        parent = doc.parent[index]
+        while parent >= 0:
+            if interactive[parent]:
+                element_text.setdefault(parent, []).append(text)
+            parent = doc.parent[parent]
+
+    elements = []
+    for index in range(count):
+        if not interactive[index]:
+            continue
+        attrs = doc.attrs[index]
+        tag = doc.name[index].lower()
+        x, y, width, height = doc.bounds[index]
+        name = (attrs.get("aria-label") or " ".join(element_text.get(index, [])) or attrs.get("placeholder")
+                or attrs.get("title") or doc.input_value.get(index) or attrs.get("value") or "")
+        elements.append({
+            "handle": doc.backend_id[index],
+            "selector": doc.unique_selector(index),
+            "role": _role_of(tag, attrs),
+            "text": name.strip()[:50],
+            "type": attrs.get("type") or tag,
+            "placeholder": attrs.get("placeholder", ""),
+            "visible": y < viewport_bottom and y + height > viewport_top,
+            "y": round(y)
+        })
+        if len(elements) >= MAX_ELEMENTS:
+            break
+
+    page_height = snapshot["documents"][0].get("contentHeight") or 0
+    return {
+        "text": "\n".join(parts),
+        "elements": elements,
+        "window": {"start": max(0, round(band_top)), "end": round(band_bottom), "page_height": round(page_height)}
+    }
+
+
+class DOMSnapshotEngine(CDPSnapshotEngine):
+    """Снимок страницы одним вызовом CDP DOMSnapshot.captureSnapshot
+
+    Дерево, раскладка и стили приходят из браузера целиком, поэтому
+    скрипты страницы не запускаются; разбор идет в Python.
+    """
+
+    async def capture(self) -> Dict[str, Any]:
+        """Получить текст окна просмотра с запасом и интерактивные элементы"""
+        cdp = await self._cdp()
+        snapshot, metrics = await asyncio.gather(
+            cdp.send("DOMSnapshot.captureSnapshot", {"computedStyles": ["visibility"]}),
+            cdp.send("Page.getLayoutMetrics")
+        )
+        viewport = metrics.get("cssLayoutViewport") or metrics["layoutViewport"]
+        top = viewport["pageY"]
+        height = viewport["clientHeight"]
+        margin = Config.EXTRACTION_CONFIG["viewport_margin"] * height
+        return decode_dom_snapshot(snapshot, top - margin, top + height + margin, top, top + height)
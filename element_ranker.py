@@ -0,0 +1,67 @@
+import re
+from typing import Any, Dict, List, Optional, Set
+
+_WORD_RE = re.compile(r"\w+")
+
+# Слова, которые встречаются почти в любой задаче и не помогают выбрать элемент
+_STOP_WORDS = {
+    "the", "a", "an", "and", "or", "to", "of", "in", "on", "for", "with", "at", "by", "from",
+    "is", "it", "this", "that", "i", "me", "my", "you", "your", "please", "page", "find", "open",
+    "и", "в", "во", "на", "с", "со", "по", "к", "о", "об", "из", "за", "для", "что", "это",
+    "как", "мне", "меня", "мой", "найди", "найти", "открой", "открыть", "страницу", "пожалуйста"
+}
+
+# Длина основы слова: грубое отсечение окончаний для русских и английских словоформ
+_STEM_LENGTH = 5
+
+# Базовый вес роли: поля ввода и кнопки чаще нужны для задачи, чем ссылки меню
+ROLE_WEIGHTS = {
+    "searchbox": 0.8,
+    "textbox": 0.6,
+    "combobox": 0.5,
+    "button": 0.4,
+    "checkbox": 0.3,
+    "radio": 0.3,
+    "link": 0.0
+}
+
+LEXICAL_WEIGHT = 2.0
+VISIBLE_WEIGHT = 1.0
+POSITION_WEIGHT = 0.5
+
+
+def _terms(text: str) -> Set[str]:
+    return {
+        word[:_STEM_LENGTH]
+        for word in _WORD_RE.findall(text.lower())
+        if len(word) > 1 and word not in _STOP_WORDS
+    }
+
+
+class ElementRanker:
+    """Локальная оценка полезности интерактивных элементов для текущей задачи
+
+    Учитывает лексическое совпадение с задачей и последними рассуждениями
+    модели, видимость, положение на странице и роль элемента.
+    """
+
+    def score(self, elem: Dict[str, Any], query_terms: Set[str]) -> float:
+        elem_text = " ".join(
+            str(elem.get(key, "")) for key in ("text", "placeholder", "selector", "type")
+        )
+        lexical = len(query_terms & _terms(elem_text))
+        position = 1.0 / (1.0 + max(elem.get("y", 0), 0) / 2000.0)
+        return (
+            LEXICAL_WEIGHT * lexical
+            + (VISIBLE_WEIGHT if elem.get("visible") else 0.0)
+            + POSITION_WEIGHT * position
+            + ROLE_WEIGHTS.get(elem.get("role", ""), 0.2)
+        )
+
+    def rank(self, elements: List[Dict[str, Any]], query: str,
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Отсортировать элементы по убыванию полезности и оставить limit лучших"""
+        query_terms = _terms(query)
+        # sorted устойчива: при равной оценке сохраняется порядок документа
+        ranked = sorted(elements, key=lambda elem: self.score(elem, query_terms), reverse=True)
+        return ranked[:limit] if limit is not None else ranked
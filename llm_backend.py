@@ -0,0 +1,248 @@
+import abc
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+from anthropic import AsyncAnthropic
+from anthropic.types import Message, Usage
+from config import Config
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+ToolUseCallback = Callable[[Dict[str, Any]], None]
+
+CASSETTE_MODES = ("record", "replay", "auto")
+
+
+class CassetteMissError(LookupError):
+    """В кассете нет ответа на запрос, а обращаться к модели запрещено"""
+
+
+def _notify_tool_uses(response: Message, on_tool_use: Optional[ToolUseCallback]):
+    if on_tool_use is None:
+        return
+    for block in response.content:
+        if block.type == "tool_use":
+            on_tool_use({"id": block.id, "name": block.name, "input": block.input})
+
+
+def response_deadline() -> float:
+    """Общий предел ожидания ответа: таймаут клиента на каждую попытку вместе с повторами"""
+    return Config.LLM_CONFIG["timeout"] * (Config.LLM_CONFIG["max_retries"] + 1)
+
+
+class LLMBackend(abc.ABC):
+    """Интерфейс модели для агентов
+
+    Запрос - аргументы Messages API (model, max_tokens, system, tools,
+    messages), ответ - anthropic.types.Message.
+    """
+
+    @abc.abstractmethod
+    async def complete(self, request: Dict[str, Any]) -> Message:
+        """Получить ответ модели целиком"""
+
+    async def stream(self, request: Dict[str, Any], on_tool_use: Optional[ToolUseCallback] = None) -> Message:
+        """Получить ответ, сообщая о каждом вызове инструмента, как только он готов
+
+        Реализация по умолчанию ждет ответ целиком; бэкенды с настоящим
+        потоком переопределяют метод.
+        """
+        response = await self.complete(request)
+        _notify_tool_uses(response, on_tool_use)
+        return response
+
+
+class AnthropicBackend(LLMBackend):
+    """Messages API Anthropic"""
+
+    def __init__(self, api_key: str):
+        self.client = AsyncAnthropic(
+            api_key=api_key,
+            timeout=Config.LLM_CONFIG["timeout"],
+            max_retries=Config.LLM_CONFIG["max_retries"]
+        )
+
+    async def complete(self, request: Dict[str, Any]) -> Message:
+        return await self.client.messages.create(**request)
+
+    async def stream(self, request: Dict[str, Any], on_tool_use: Optional[ToolUseCallback] = None) -> Message:
+        async with self.client.messages.stream(**request) as stream:
+            async for event in stream:
+                if event.type == "content_block_stop" and on_tool_use is not None:
+                    block = stream.current_message_snapshot.content[event.index]
+                    if block.type == "tool_use":
+                        on_tool_use({"id": block.id, "name": block.name, "input": block.input})
+            return await stream.get_final_message()
+
+
+def normalize_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Привести запрос к виду, не зависящему от случайных деталей
+
+    Убираются метки cache_control (точки кэширования сдвигаются вместе с
+    историей), идентификаторы вызовов инструментов заменяются номерами по
+    порядку появления, у текстов обрезаются пробелы по краям.
+    """
+    tool_ids: Dict[str, str] = {}
+
+    def tool_id(value: str) -> str:
+        return tool_ids.setdefault(value, f"tool_{len(tool_ids)}")
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if key == "cache_control":
+                    continue
+                if (key == "id" and value.get("type") == "tool_use") or key == "tool_use_id":
+                    result[key] = tool_id(item)
+                else:
+                    result[key] = normalize(item)
+            return result
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    return normalize(request)
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Хэш нормализованного запроса - имя записи в кассете"""
+    normalized = json.dumps(normalize_request(request), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class RecordReplayBackend(LLMBackend):
+    """Кассета запросов и ответов модели на диске
+
+    Режимы: record - всегда спрашивать модель и перезаписывать ответ,
+    replay - отвечать только из кассеты, auto - из кассеты, а при промахе
+    спросить модель и записать ответ. Один JSON файл на хэш запроса.
+    """
+
+    def __init__(self, directory: str, inner: Optional[LLMBackend] = None, mode: str = "auto"):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        if mode != "replay" and inner is None:
+            raise ValueError(f"Для режима {mode} нужен бэкенд модели")
+        self.directory = directory
+        self.inner = inner
+        self.mode = mode
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[Message]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return Message.model_validate(json.load(f)["response"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось прочитать запись кассеты {path}: {e}")
+            return None
+
+    def _save(self, key: str, request: Dict[str, Any], response: Message):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Запрос хранится рядом с ответом, чтобы промах можно было разобрать по diff
+        entry = {"request": normalize_request(request), "response": response.model_dump(mode="json")}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        self.stats["recorded"] += 1
+
+    def _lookup(self, request: Dict[str, Any]) -> Tuple[str, Optional[Message]]:
+        key = request_key(request)
+        cached = self._load(key) if self.mode != "record" else None
+        if cached is not None:
+            self.stats["hits"] += 1
+            return key, cached
+        self.stats["misses"] += 1
+        if self.mode == "replay":
+            raise CassetteMissError(f"Нет записи для запроса {key[:16]} в {self.directory}")
+        return key, None
+
+    async def complete(self, request: Dict[str, Any]) -> Message:
+        key, cached = self._lookup(request)
+        if cached is not None:
+            return cached
+        response = await self.inner.complete(request)
+        self._save(key, request, response)
+        return response
+
+    async def stream(self, request: Dict[str, Any], on_tool_use: Optional[ToolUseCallback] = None) -> Message:
+        key, cached = self._lookup(request)
+        if cached is not None:
+            _notify_tool_uses(cached, on_tool_use)
+            return cached
+        response = await self.inner.stream(request, on_tool_use)
+        self._save(key, request, response)
+        return response
+
+
+class CachingBackend(LLMBackend):
+    """Кэш ответов перед моделью
+
+    Ключ - хэш нормализованного запроса: системный промпт, история и
+    текущее состояние страницы входят в него целиком, поэтому ответ
+    переиспользуется только для побайтно того же шага той же задачи.
+    У ответа из кэша нулевой usage - токены на него не тратились.
+    """
+
+    def __init__(self, inner: LLMBackend, cache: ResponseCache):
+        self.inner = inner
+        self.cache = cache
+
+    def _cached(self, key: str) -> Optional[Message]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        return Message.model_validate(entry).model_copy(update={"usage": Usage(input_tokens=0, output_tokens=0)})
+
+    def _store(self, key: str, response: Message):
+        # Обрезанный по max_tokens ответ при повторе стоит запросить заново
+        if response.stop_reason != "max_tokens":
+            self.cache.put(key, response.model_dump(mode="json"))
+
+    async def complete(self, request: Dict[str, Any]) -> Message:
+        key = request_key(request)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        response = await self.inner.complete(request)
+        self._store(key, response)
+        return response
+
+    async def stream(self, request: Dict[str, Any], on_tool_use: Optional[ToolUseCallback] = None) -> Message:
+        key = request_key(request)
+        cached = self._cached(key)
+        if cached is not None:
+            _notify_tool_uses(cached, on_tool_use)
+            return cached
+        response = await self.inner.stream(request, on_tool_use)
+        self._store(key, response)
+        return response
+
+
+def create_backend(api_key: str) -> LLMBackend:
+    """Бэкенд модели по конфигурации: Anthropic, при необходимости за кассетой и кэшем ответов"""
+    mode = Config.LLM_CONFIG["cassette_mode"]
+    if not mode:
+        backend: LLMBackend = AnthropicBackend(api_key)
+    else:
+        inner = AnthropicBackend(api_key) if mode != "replay" else None
+        backend = RecordReplayBackend(Config.LLM_CONFIG["cassette_dir"], inner, mode)
+
+    cache_config = Config.RESPONSE_CACHE_CONFIG
+    if cache_config["enabled"]:
+        cache = ResponseCache(cache_config["path"], cache_config["ttl_seconds"], cache_config["max_bytes"])
+        backend = CachingBackend(backend, cache)
+    return backend
@@ -4,11 +4,14 @@ AI Browser Agent - Главная точка входа
 Автономный AI-агент для автоматизации веб-браузера
 """
 
+import argparse
 import asyncio
+import json
 import sys
 import os
 from dotenv import load_dotenv
 from advanced_agent import AdvancedAIAgent
+from batch_runner import BatchRunner
 from cli import AgentCLI
 
 
@@ -49,12 +52,43 @@ async def run_agent_from_args():
         await agent.close()
 
 
+async def run_batch_from_args():
+    """Запустить пакетное выполнение задач из JSONL"""
+    parser = argparse.ArgumentParser(description="Пакетный режим AI Browser Agent")
+    parser.add_argument("--batch", required=True, help="JSONL файл с задачами ('-' для stdin)")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL файл для результатов")
+    parser.add_argument("--concurrency", type=int, default=4, help="Количество задач одновременно")
+    parser.add_argument("--resume", action="store_true", help="Пропустить задачи, уже завершенные в --output")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    
+    if not api_key:
+        print("Ошибка: ANTHROPIC_API_KEY не установлен в .env файле")
+        return False
+    
+    runner = BatchRunner(api_key, concurrency=args.concurrency, resume=args.resume)
+    summary = await runner.run(args.batch, args.output)
+    
+    print(f"\n{'='*60}")
+    print(f"Пакет завершен:\n{json.dumps(summary, ensure_ascii=False, indent=2)}")
+    print(f"{'='*60}\n")
+    
+    return summary["failed"] == 0 and summary["incomplete"] == 0
+
+
 async def main():
     """Главная функция"""
     print("\n" + "="*60)
     print("AI Browser Agent")
     print("="*60)
     
+    # Пакетный режим
+    if "--batch" in sys.argv:
+        success = await run_batch_from_args()
+        sys.exit(0 if success else 1)
+    
     # Проверяем, передана ли задача как аргумент
     if len(sys.argv) > 1:
         success = await run_agent_from_args()
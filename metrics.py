@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _escape_label(value: Any) -> str:
+    """Экранировать значение метки по формату экспозиции Prometheus"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class TaskMetrics:
+    """Метрики одной задачи: длительности фаз, вызовы инструментов, токены и размеры страниц"""
+
+    def __init__(self, task: str, task_id: Optional[str] = None):
+        self.task = task
+        self.task_id = task_id
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.duration_seconds = 0.0
+        self.status = "running"
+        self.iterations = 0
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.tools: Dict[str, Dict[str, float]] = {}
+        self.tokens = {"input": 0, "output": 0, "cache_read": 0, "cache_write": 0, "prompt_estimated": 0}
+        self.llm_calls = 0
+        self.pages = {"snapshots": 0, "full_snapshots": 0, "text_chars": 0, "max_text_chars": 0, "elements": 0}
+        # Ожидание стабилизации входит во время инструментов и учитывается отдельно
+        self.settle = {"count": 0, "total_seconds": 0.0}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Замерить длительность фазы внутри блока with"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.monotonic() - started)
+
+    def record_phase(self, name: str, seconds: float, count: int = 1):
+        stats = self.phases.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += count
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds / count if count else 0.0)
+
+    def record_tool(self, name: str, seconds: float, ok: bool):
+        stats = self.tools.setdefault(name, {"count": 0, "errors": 0, "total_seconds": 0.0})
+        stats["count"] += 1
+        stats["errors"] += 0 if ok else 1
+        stats["total_seconds"] += seconds
+
+    def record_llm_call(self, usage: Dict[str, int]):
+        self.llm_calls += 1
+        for key, value in usage.items():
+            self.tokens[key] += value
+
+    def record_prompt_estimate(self, tokens: int):
+        self.tokens["prompt_estimated"] += tokens
+
+    def record_page(self, text_chars: int, elements: int, full: bool):
+        self.pages["snapshots"] += 1
+        self.pages["full_snapshots"] += 1 if full else 0
+        self.pages["text_chars"] += text_chars
+        self.pages["max_text_chars"] = max(self.pages["max_text_chars"], text_chars)
+        self.pages["elements"] += elements
+
+    def record_settle(self, count: int, seconds: float):
+        self.settle["count"] += count
+        self.settle["total_seconds"] += seconds
+
+    def finish(self, status: str):
+        self.status = status
+        self.duration_seconds = time.monotonic() - self._started
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Отчет по задаче в виде словаря для JSON"""
+        accounted = sum(stats["total_seconds"] for stats in self.phases.values())
+        return {
+            "task_id": self.task_id,
+            "task": self.task,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration_seconds, 4),
+            "unaccounted_seconds": round(max(self.duration_seconds - accounted, 0.0), 4),
+            "iterations": self.iterations,
+            "llm_calls": self.llm_calls,
+            "phases": {
+                name: {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+                for name, stats in self.phases.items()
+            },
+            "tools": {
+                name: {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+                for name, stats in self.tools.items()
+            },
+            "tokens": dict(self.tokens),
+            "pages": dict(self.pages),
+            "settle": {"count": self.settle["count"], "total_seconds": round(self.settle["total_seconds"], 4)}
+        }
+
+
+class MetricsExporter:
+    """Экспорт отчетов задач в JSONL и в textfile для node_exporter (Prometheus)
+
+    Счетчики Prometheus накапливаются по всем задачам процесса, файл
+    перезаписывается целиком после каждой задачи.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._totals: Dict[str, Dict[tuple, float]] = {}
+
+    @classmethod
+    def from_config(cls) -> "MetricsExporter":
+        return cls(Config.METRICS_CONFIG["jsonl_path"] or None, Config.METRICS_CONFIG["prometheus_path"] or None)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jsonl_path or self.prometheus_path)
+
+    def export(self, report: Dict[str, Any]):
+        """Записать отчет задачи во все настроенные приемники"""
+        if not self.enabled:
+            return
+        try:
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(report, ensure_ascii=False) + "\n")
+            if self.prometheus_path:
+                self._accumulate(report)
+                self._write_textfile()
+        except OSError as e:
+            logger.warning(f"Не удалось экспортировать метрики: {e}")
+
+    def _add(self, metric: str, labels: tuple, value: float):
+        series = self._totals.setdefault(metric, {})
+        series[labels] = series.get(labels, 0.0) + value
+
+    def _accumulate(self, report: Dict[str, Any]):
+        self._add("agent_tasks_total", (("status", report["status"]),), 1)
+        self._add("agent_task_duration_seconds_total", (), report["duration_seconds"])
+        self._add("agent_iterations_total", (), report["iterations"])
+        self._add("agent_llm_calls_total", (), report["llm_calls"])
+        for phase, stats in report["phases"].items():
+            self._add("agent_phase_seconds_total", (("phase", phase),), stats["total_seconds"])
+            self._add("agent_phase_calls_total", (("phase", phase),), stats["count"])
+        for tool, stats in report["tools"].items():
+            self._add("agent_tool_calls_total", (("tool", tool),), stats["count"])
+            self._add("agent_tool_errors_total", (("tool", tool),), stats["errors"])
+            self._add("agent_tool_seconds_total", (("tool", tool),), stats["total_seconds"])
+        for kind, value in report["tokens"].items():
+            self._add("agent_tokens_total", (("kind", kind),), value)
+        self._add("agent_page_text_chars_total", (), report["pages"]["text_chars"])
+        self._add("agent_page_snapshots_total", (), report["pages"]["snapshots"])
+        self._add("agent_settle_seconds_total", (), report["settle"]["total_seconds"])
+
+    def _write_textfile(self):
+        lines: List[str] = []
+        for metric in sorted(self._totals):
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(self._totals[metric].items()):
+                label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+                # Счетчики растут неограниченно - без округления до значащих цифр
+                value_text = str(int(value)) if float(value).is_integer() else repr(float(value))
+                lines.append(f"{metric}{{{label_text}}} {value_text}" if label_text else f"{metric} {value_text}")
+        # node_exporter может прочитать файл в любой момент - запись через переименование
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
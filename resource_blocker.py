@@ -0,0 +1,113 @@
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Route, Response
+
+logger = logging.getLogger(__name__)
+
+# Профили блокировки: типы ресурсов Playwright и блокировка трекеров
+BLOCK_PROFILES = {
+    "none": {
+        "resource_types": set(),
+        "block_trackers": False
+    },
+    "light": {
+        "resource_types": {"image", "media", "font"},
+        "block_trackers": True
+    },
+    "aggressive": {
+        "resource_types": {"image", "media", "font", "texttrack", "manifest", "ping", "eventsource"},
+        "block_trackers": True
+    }
+}
+
+# Домены аналитики и рекламы (блокируются вместе с поддоменами)
+TRACKER_DOMAINS = {
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "mc.yandex.ru",
+    "top-fwz1.mail.ru",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.io",
+    "mixpanel.com",
+    "amplitude.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "nr-data.net"
+}
+
+
+class ResourceBlocker:
+    """Перехват запросов контекста браузера по профилю блокировки"""
+
+    def __init__(self, profile: str = "none"):
+        if profile not in BLOCK_PROFILES:
+            raise ValueError(f"Неизвестный профиль блокировки: {profile}")
+        self.profile = profile
+        self.resource_types = BLOCK_PROFILES[profile]["resource_types"]
+        self.block_trackers = BLOCK_PROFILES[profile]["block_trackers"]
+        self.stats: Dict[str, Any] = {
+            "blocked_requests": 0,
+            "blocked_trackers": 0,
+            "blocked_by_type": {},
+            "loaded_responses": 0,
+            "loaded_bytes": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.resource_types) or self.block_trackers
+
+    async def install(self, context: BrowserContext):
+        """Подключить блокировку и учет трафика к контексту"""
+        context.on("response", self._on_response)
+        if self.enabled:
+            # Перехват маршрутов отключает HTTP-кэш Chromium, поэтому
+            # при профиле "none" он не устанавливается
+            await context.route("**/*", self._handle_route)
+
+    def is_tracker(self, url: str) -> bool:
+        host = urlparse(url).hostname or ""
+        return any(host == domain or host.endswith("." + domain) for domain in TRACKER_DOMAINS)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить счетчики заблокированных и загруженных запросов"""
+        stats = dict(self.stats)
+        stats["blocked_by_type"] = dict(self.stats["blocked_by_type"])
+        stats["profile"] = self.profile
+        return stats
+
+    async def _handle_route(self, route: Route):
+        request = route.request
+        reason: Optional[str] = None
+        if request.resource_type in self.resource_types:
+            reason = request.resource_type
+        elif self.block_trackers and request.resource_type != "document" and self.is_tracker(request.url):
+            reason = "tracker"
+            self.stats["blocked_trackers"] += 1
+
+        if reason is None:
+            await route.continue_()
+            return
+
+        self.stats["blocked_requests"] += 1
+        by_type = self.stats["blocked_by_type"]
+        by_type[reason] = by_type.get(reason, 0) + 1
+        await route.abort("blockedbyclient")
+
+    def _on_response(self, response: Response):
+        # Размер заблокированных ответов неизвестен (они не запрашиваются),
+        # поэтому считается объем фактически загруженного по Content-Length
+        self.stats["loaded_responses"] += 1
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.stats["loaded_bytes"] += int(length)
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Постоянный кэш ответов модели в SQLite с вытеснением по TTL и размеру
+
+    Записи старше ttl_seconds не выдаются и удаляются при очередной
+    записи; если суммарный размер превышает max_bytes, вытесняются
+    записи, к которым дольше всего не обращались.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Найти живую запись по ключу"""
+        now = time.time()
+        row = self._db.execute(
+            "SELECT value FROM responses WHERE key = ? AND created_at >= ?", (key, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self._db.execute("UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        self._db.commit()
+        self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Сохранить запись и вытеснить устаревшие и лишние"""
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data.encode("utf-8")), now, now)
+        )
+        self.stats["stores"] += 1
+        self._evict(now)
+        self._db.commit()
+
+    def _evict(self, now: float):
+        expired = self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.stats["evictions"] += expired.rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Самые давно использованные записи удаляются, пока размер не уложится в лимит
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Статистика процесса и размер хранилища"""
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(
+            self.stats,
+            hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            entries=entries,
+            bytes=size
+        )
+
+    def close(self):
+        self._db.close()
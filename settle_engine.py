@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Optional, Set
+from playwright.async_api import Page, Request
+
+logger = logging.getLogger(__name__)
+
+# Ждет, пока DOM не будет меняться quietMs миллисекунд (не дольше timeoutMs).
+# Время последней мутации ведет трекер DOM из browser_controller.
+_DOM_QUIET_JS = """
+([quietMs, timeoutMs]) => new Promise(resolve => {
+    const state = window.__agentDom;
+    if (!state) {
+        resolve(true);
+        return;
+    }
+    const start = performance.now();
+    const check = () => {
+        const now = performance.now();
+        const idle = now - state.lastMutation;
+        if (idle >= quietMs) {
+            resolve(true);
+        } else if (now - start >= timeoutMs) {
+            resolve(false);
+        } else {
+            setTimeout(check, Math.min(quietMs - idle, timeoutMs - (now - start)));
+        }
+    };
+    check();
+})
+"""
+
+
+class SettleEngine:
+    """Ожидание стабилизации страницы по событиям вместо фиксированных пауз"""
+
+    def __init__(self, page: Page, dom_quiet_ms: int = 200, network_quiet_ms: int = 300,
+                 timeout: float = 5.0):
+        self.page = page
+        self.dom_quiet_ms = dom_quiet_ms
+        self.network_quiet_ms = network_quiet_ms
+        self.timeout = timeout
+        self._inflight: Set[Request] = set()
+        self._network_idle = asyncio.Event()
+        self._network_idle.set()
+        self._last_network_activity = 0.0
+
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+    def _on_request(self, request: Request):
+        self._inflight.add(request)
+        self._network_idle.clear()
+        self._last_network_activity = asyncio.get_running_loop().time()
+
+    def _on_request_done(self, request: Request):
+        self._inflight.discard(request)
+        self._last_network_activity = asyncio.get_running_loop().time()
+        if not self._inflight:
+            self._network_idle.set()
+
+    async def settle(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться загрузки документа, тишины в сети и в DOM
+
+        Возвращает False, если страница не успокоилась за отведенное время.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout if timeout is None else timeout)
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.info(f"Страница не стабилизировалась, запросов в процессе: {len(self._inflight)}")
+                return False
+
+            try:
+                await self.page.wait_for_load_state("domcontentloaded", timeout=remaining * 1000)
+                dom_quiet = await self.page.evaluate(
+                    _DOM_QUIET_JS, [self.dom_quiet_ms, (deadline - loop.time()) * 1000]
+                )
+            except Exception as e:
+                # Контекст выполнения уничтожен навигацией - ждем новый документ
+                logger.debug(f"Ожидание стабилизации прервано: {e}")
+                await asyncio.sleep(0.05)
+                continue
+
+            if not dom_quiet:
+                continue
+
+            try:
+                await asyncio.wait_for(self._network_idle.wait(), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                continue
+
+            quiet_for = loop.time() - self._last_network_activity
+            if quiet_for * 1000 >= self.network_quiet_ms:
+                return True
+            await asyncio.sleep(self.network_quiet_ms / 1000 - quiet_for)
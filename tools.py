@@ -0,0 +1,146 @@
+from typing import Any, Dict, List
+
+# Описания инструментов агента для нативного tool use API
+TOOL_DEFINITIONS: List[Dict[str, Any]] = [
+    {
+        "name": "navigate",
+        "description": "Navigate the browser to a URL.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string", "description": "Absolute URL to open"}
+            },
+            "required": ["url"]
+        }
+    },
+    {
+        "name": "click",
+        "description": "Click an element by its handle (e.g. @12) or CSS selector.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "selector": {"type": "string", "description": "Element handle such as @12 or a CSS selector"}
+            },
+            "required": ["selector"]
+        }
+    },
+    {
+        "name": "type",
+        "description": "Fill an input field with text, replacing its current value.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "selector": {"type": "string", "description": "Input handle such as @12 or a CSS selector"},
+                "text": {"type": "string", "description": "Text to type"}
+            },
+            "required": ["selector", "text"]
+        }
+    },
+    {
+        "name": "scroll",
+        "description": "Scroll the page.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "direction": {"type": "string", "enum": ["up", "down"]},
+                "amount": {"type": "integer", "description": "Number of scroll steps", "minimum": 1}
+            }
+        }
+    },
+    {
+        "name": "wait",
+        "description": "Wait for the given number of seconds.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "seconds": {"type": "number", "minimum": 0}
+            }
+        }
+    },
+    {
+        "name": "extract_text",
+        "description": "Get the visible text of the current page.",
+        "input_schema": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "read_more",
+        "description": (
+            "Read the next portion of the page text outside the part already shown, without scrolling. "
+            "Continue from the previous portion by omitting cursor, or pass a cursor from an earlier result."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "cursor": {"type": "integer", "description": "Offset from the top of the page in pixels", "minimum": 0}
+            }
+        }
+    },
+    {
+        "name": "get_elements",
+        "description": "List interactive elements of the current page with their selectors.",
+        "input_schema": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "screenshot",
+        "description": "Save a screenshot of the current page.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path for the PNG image"}
+            }
+        }
+    },
+    {
+        "name": "get_url",
+        "description": "Get the current page URL.",
+        "input_schema": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "wait_for_element",
+        "description": "Wait until an element matching the selector appears.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "selector": {"type": "string", "description": "Element handle such as @12 or a CSS selector"},
+                "timeout": {"type": "integer", "description": "Timeout in milliseconds", "minimum": 0}
+            },
+            "required": ["selector"]
+        }
+    }
+]
+
+
+def response_to_message(content) -> Dict[str, Any]:
+    """Преобразовать блоки ответа модели в сообщение assistant для истории"""
+    blocks = []
+    for block in content:
+        if block.type == "text":
+            if block.text:
+                blocks.append({"type": "text", "text": block.text})
+        elif block.type == "tool_use":
+            blocks.append({"type": "tool_use", "id": block.id, "name": block.name, "input": block.input})
+    if not blocks:
+        blocks.append({"type": "text", "text": "(empty response)"})
+    return {"role": "assistant", "content": blocks}
+
+
+def response_text(content) -> str:
+    """Текстовая часть ответа модели"""
+    return "\n".join(block.text for block in content if block.type == "text")
+
+
+def extract_tool_calls(content) -> List[Dict[str, Any]]:
+    """Вызовы инструментов из ответа модели в порядке их следования"""
+    return [
+        {"id": block.id, "name": block.name, "input": block.input}
+        for block in content
+        if block.type == "tool_use"
+    ]
+
+
+def tool_result_block(tool_use_id: str, result: str, is_error: bool = False) -> Dict[str, Any]:
+    """Блок результата инструмента для следующего сообщения пользователя"""
+    block = {"type": "tool_result", "tool_use_id": tool_use_id, "content": result}
+    if is_error:
+        block["is_error"] = True
+    return block
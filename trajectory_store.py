@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+from browser_controller import BrowserController
+
+logger = logging.getLogger(__name__)
+
+# Инструменты, меняющие состояние страницы; только они записываются в траекторию.
+# Ожидание "wait" не записывается - после действий страница и так дожидается стабилизации
+REPLAYABLE_TOOLS = {"navigate", "click", "type", "scroll", "wait_for_element"}
+
+
+def task_fingerprint(task: str) -> str:
+    """Отпечаток задачи, не зависящий от регистра и пробелов"""
+    normalized = " ".join(task.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def checkpoint_matches(checkpoint: Dict[str, Any], url: str) -> bool:
+    """Совпадает ли текущая страница с контрольной точкой (хост и путь URL)"""
+    expected = urlparse(checkpoint["url"])
+    actual = urlparse(url)
+    return (expected.netloc, expected.path.rstrip("/")) == (actual.netloc, actual.path.rstrip("/"))
+
+
+class TrajectoryRecorder:
+    """Запись успешно выполненных действий агента с контрольными точками
+
+    Введенный текст по умолчанию не сохраняется (text=None): в нем бывают
+    пароли и личные данные. Воспроизведение останавливается на таком шаге.
+    С record_typed_text текст сохраняется, кроме полей паролей.
+    """
+
+    def __init__(self, task: str, record_typed_text: bool = False):
+        self.task = task
+        self.record_typed_text = record_typed_text
+        self.steps: List[Dict[str, Any]] = []
+
+    def record(self, tool_name: str, tool_input: Dict[str, Any], url: str, sensitive: bool = False):
+        if tool_name not in REPLAYABLE_TOOLS:
+            return
+        if tool_name == "type" and (sensitive or not self.record_typed_text):
+            tool_input = dict(tool_input, text=None)
+        self.steps.append({"tool": tool_name, "input": tool_input, "checkpoint": {"url": url}})
+
+    def to_trajectory(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": task_fingerprint(self.task),
+            "task": self.task,
+            "domain": urlparse(self.steps[0]["checkpoint"]["url"]).netloc if self.steps else "",
+            "created_at": time.time(),
+            "steps": self.steps
+        }
+
+
+class TrajectoryStore:
+    """Локальное хранилище траекторий: один JSON файл на отпечаток задачи"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def load(self, task: str) -> Optional[Dict[str, Any]]:
+        """Найти траекторию для задачи"""
+        path = self._path(task_fingerprint(task))
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Не удалось прочитать траекторию {path}: {e}")
+            return None
+
+    def save(self, trajectory: Dict[str, Any]):
+        """Сохранить траекторию, заменив предыдущую для той же задачи"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(trajectory["fingerprint"])
+        # Запись через временный файл: параллельные задачи пакета не увидят половину файла
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trajectory, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        logger.info(f"Траектория сохранена: {path} ({len(trajectory['steps'])} шагов)")
+
+
+async def replay_trajectory(browser: BrowserController, trajectory: Dict[str, Any],
+                            run_step: Callable[[str, Dict[str, Any]], Awaitable[Optional[str]]]) -> Dict[str, Any]:
+    """Повторить записанные шаги без модели, проверяя контрольные точки
+
+    Воспроизведение останавливается на первом шаге, который завершился
+    ошибкой, был отклонен или привел на другую страницу, а также перед
+    вводом несохраненного текста.
+    """
+    steps = trajectory["steps"]
+    replay = {"total": len(steps), "replayed": 0, "diverged": None}
+    for number, step in enumerate(steps, 1):
+        if step["tool"] == "type" and step["input"].get("text") is None:
+            replay["diverged"] = f"step {number} type into {step['input'].get('selector')}: the typed text was not recorded"
+            break
+        result = await run_step(step["tool"], step["input"])
+        if result is None:
+            replay["diverged"] = f"step {number} {step['tool']} was rejected"
+            break
+        if result.startswith("Error executing"):
+            replay["diverged"] = f"step {number} {step['tool']} failed: {result}"
+            break
+
+        url = await browser.get_current_url()
+        if not checkpoint_matches(step["checkpoint"], url):
+            replay["diverged"] = (
+                f"after step {number} {step['tool']} the page is {url}, "
+                f"expected {step['checkpoint']['url']}"
+            )
+            break
+        replay["replayed"] += 1
+
+    if replay["diverged"]:
+        logger.info(f"Воспроизведение расходится со страницей: {replay['diverged']}")
+    logger.info(f"Воспроизведено шагов траектории: {replay['replayed']}/{replay['total']}")
+    return replay